@@ -1,3 +1,8 @@
 from django.contrib import admin
 
-# Register your models here.
+from data.models import Channel, Event, Session, Statistic
+
+admin.site.register(Session)
+admin.site.register(Channel)
+admin.site.register(Event)
+admin.site.register(Statistic)
@@ -0,0 +1,197 @@
+"""
+Load test of a running server with the full upload, visualize and download flow.
+
+Every virtual user has its own cookies and CSRF token and repeats the flow of a browser: open the home page, upload an
+MVC and a main file, open the visualize page and download the zip. The latency of every request is recorded, together
+with the resident memory of the server's worker processes, read from /proc.
+"""
+import gzip
+import http.cookiejar
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+STEPS = ['home', 'upload', 'visualize', 'download']
+COLUMNS = ['CH1', 'CH2', 'Timestamp', 'Event']
+
+
+def synthetic_files(directory: str, minutes: float, fileType: str='csv') -> dict:
+    """Write a 1 minute MVC recording and a main recording of the given length, returning the paths by form field."""
+    from data.src.synthetic import standard_session
+
+    paths = {}
+    for field, length, seed in [('MVC-file1', 1, 1), ('MG-file1', minutes, 2)]:
+        df = standard_session(length, seed=seed).df
+        path = os.path.join(directory, f'{field}.{fileType}')
+        if fileType == 'mat':
+            import scipy.io
+            scipy.io.savemat(path, {col: df[col].to_numpy() for col in df.columns})
+        else:
+            df.to_csv(path, index=False)
+        paths[field] = path
+    return paths
+
+
+def multipart(fields: list, files: dict) -> tuple:
+    """Encode form fields, a list of (name, value), and files, a mapping of field name to path, as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, path in files.items():
+        with open(path, 'rb') as file:
+            content = file.read()
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{os.path.basename(path)}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), 'multipart/form-data; boundary=' + boundary
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects instead of following them, so every request of the flow is timed on its own."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    """One browser session running the flow against the server at url."""
+
+    def __init__(self, url: str, files: dict) -> None:
+        self.url = url.rstrip('/')
+        self.files = files
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect())
+
+    def request(self, path: str, body: bytes=None, contentType: str=None) -> tuple:
+        """Status, location header and body of one request. Compressed bodies are decompressed to check them."""
+        req = urllib.request.Request(self.url + path, data=body, headers={'Accept-Encoding': 'gzip'})
+        if contentType:
+            req.add_header('Content-Type', contentType)
+            req.add_header('Referer', self.url + '/')
+        try:
+            with self.opener.open(req, timeout=600) as response:
+                status, headers, content = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as err:
+            status, headers, content = err.code, err.headers, err.read()
+        if headers.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return status, headers.get('Location', ''), content
+
+    def csrf_token(self) -> str:
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def flow(self) -> list:
+        """Run the flow once, returning (step, seconds, ok) for every request. The flow stops at the first failure."""
+        fields = [('csrfmiddlewaretoken', None)]
+        for field in self.files:
+            fields += [('ch1Name', COLUMNS[0]), ('ch2Name', COLUMNS[1]), ('timestampName', COLUMNS[2]), ('eventMarker', COLUMNS[3])]
+        query = urllib.parse.urlencode({field: ','.join(COLUMNS) for field in self.files})
+
+        def upload():
+            body, contentType = multipart([(name, self.csrf_token() if value is None else value) for name, value in fields], self.files)
+            return self.request('/?' + query, body, contentType)
+
+        checks = [
+            ('home', lambda: self.request('/'), lambda status, location: status == 200),
+            ('upload', upload, lambda status, location: status == 302 and 'error' not in location),
+            ('visualize', lambda: self.request('/visualize/'), lambda status, location: status == 200),
+            ('download', lambda: self.request('/visualize/download_zip/'), lambda status, location: status == 200),
+        ]
+
+        results = []
+        for step, send, check in checks:
+            start = time.perf_counter()
+            try:
+                status, location, _ = send()
+                ok = check(status, location)
+            except OSError:
+                ok = False
+            results.append((step, time.perf_counter() - start, ok))
+            if not ok:
+                break
+        return results
+
+
+def rss(pid: int) -> dict:
+    """Current and peak resident memory of a process in MB, or None if it has exited."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            lines = dict(line.split(':', 1) for line in status if ':' in line)
+    except OSError:
+        return None
+    return {'rss_mb': int(lines['VmRSS'].split()[0]) / 1024, 'peak_mb': int(lines['VmHWM'].split()[0]) / 1024}
+
+
+def run_load(url: str, files: dict, users: int, iterations: int, pids: list=None, interval: float=0.5) -> dict:
+    """
+    Run iterations flows for each of users concurrent virtual users and summarize the latencies.
+
+    Returns the latency percentiles (ms), error rate and count of every step and of the whole flow, the throughput in
+    flows and requests per second, and per worker pid the largest resident memory sampled during the run and the
+    peak resident memory of the process so far.
+    """
+    pids = pids or []
+    memory = {pid: 0.0 for pid in pids}
+    finished = threading.Event()
+
+    def sample():
+        while True:
+            for pid in pids:
+                usage = rss(pid)
+                if usage:
+                    memory[pid] = max(memory[pid], usage['rss_mb'])
+            if finished.wait(interval):
+                return
+
+    def user(_):
+        client = VirtualUser(url, files)
+        return [client.flow() for _ in range(iterations)]
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        flows = [flow for flows in executor.map(user, range(users)) for flow in flows]
+    elapsed = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+
+    def summary(latencies: list, failures: int) -> dict:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (None, None, None)
+        return {
+            'count': len(latencies),
+            'error_rate': failures / len(latencies) if latencies else None,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+        }
+
+    steps = {}
+    for step in STEPS:
+        results = [(seconds, ok) for flow in flows for name, seconds, ok in flow if name == step]
+        steps[step] = summary([seconds for seconds, _ in results], sum(not ok for _, ok in results))
+
+    completed = [flow for flow in flows if len(flow) == len(STEPS) and all(ok for _, _, ok in flow)]
+    return {
+        'users': users,
+        'iterations': iterations,
+        'seconds': elapsed,
+        'flows_per_second': len(completed) / elapsed,
+        'requests_per_second': sum(len(flow) for flow in flows) / elapsed,
+        'flow': summary([sum(seconds for _, seconds, _ in flow) for flow in flows], len(flows) - len(completed)),
+        'steps': steps,
+        'worker_rss_mb': {str(pid): {'max': sampled, 'peak': (rss(pid) or {}).get('peak_mb')} for pid, sampled in memory.items()},
+    }
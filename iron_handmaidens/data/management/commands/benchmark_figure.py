@@ -0,0 +1,38 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from data.src.synthetic import standard_session
+
+
+class Command(BaseCommand):
+    help = 'Measure the visualize page payload of a standard session for the SVG and binary WebGL figure modes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, default=10, help='Length of the synthetic session.')
+        parser.add_argument('--max-points', type=int, default=1000, help='Maximum plotted points per trace.')
+        parser.add_argument('--output', help='Append the results as a line of JSON to this file.')
+
+    def handle(self, *args, **options):
+        data = standard_session(options['minutes']).preprocess()
+        data.maxDataPoints = options['max_points']
+        visible = data.find_columns(['RMS'])
+
+        results = {'minutes': options['minutes'], 'max_points': options['max_points']}
+        for mode, binary in [('svg', False), ('webgl', True)]:
+            start = time.perf_counter()
+            html = data.data_to_html(visible=visible, eventMarkers=data.eventName, binary=binary).encode()
+            results[mode] = {
+                'bytes': len(html),
+                'gzip_bytes': len(gzip.compress(html)),
+                'build_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+            self.stdout.write(f'{mode}:'.ljust(8) + ', '.join(f'{key} {value}' for key, value in results[mode].items()))
+
+        self.stdout.write('Browser render time is logged to the console by the binary figure script.')
+
+        if options['output']:
+            with open(options['output'], 'a') as out:
+                out.write(json.dumps(results) + '\n')
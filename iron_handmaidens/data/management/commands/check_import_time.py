@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from data.preload import HEAVY_MODULES
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module loaded by importing module, measured with -X importtime."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'iron_handmaidens.settings'))
+    env.pop('IRON_HANDMAIDENS_PRELOAD', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup(); import ' + module],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError('Importing ' + module + ' failed:\n' + result.stderr)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class Command(BaseCommand):
+    help = 'Fail if importing the views takes longer than the budget or loads pandas, SciPy or plotly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='data.views', help='Module to import.')
+        parser.add_argument('--budget-ms', type=float, default=150, help='Maximum cumulative import time of the module.')
+
+    def handle(self, *args, **options):
+        module = options['module']
+        times = import_times(module)
+
+        elapsed = times.get(module, 0) / 1000
+        self.stdout.write(f'{module} imported in {elapsed:.1f} ms (budget {options["budget_ms"]:.0f} ms)')
+
+        eager = [name for name in HEAVY_MODULES if name in times]
+        if eager:
+            raise CommandError('Heavy modules imported eagerly: ' + ', '.join(eager))
+        if elapsed > options['budget_ms']:
+            raise CommandError('Import time budget exceeded')
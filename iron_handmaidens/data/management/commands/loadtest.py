@@ -0,0 +1,51 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a running server (runserver or an ASGI server) with concurrent users running the upload, visualize '
+        'and download flow on synthetic files. Reports latency percentiles, throughput, error rate and worker memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base url of the server.')
+        parser.add_argument('--users', type=int, default=4, help='Number of concurrent users.')
+        parser.add_argument('--iterations', type=int, default=5, help='Number of flows run by every user.')
+        parser.add_argument('--minutes', type=float, default=5, help='Length of the synthetic main recording.')
+        parser.add_argument('--file-type', choices=['csv', 'mat'], default='csv', help='Format of the uploaded files.')
+        parser.add_argument('--pid', type=int, action='append', help='Server worker pid to measure the memory of, can be repeated.')
+        parser.add_argument('--output', help='Append the results as a line of JSON to this file.')
+
+    def handle(self, *args, **options):
+        # Imported here to keep pandas out of every other management command.
+        from data.loadtest import STEPS, run_load, synthetic_files
+
+        if options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError('At least one user and one iteration are needed.')
+
+        with tempfile.TemporaryDirectory() as directory:
+            files = synthetic_files(directory, options['minutes'], options['file_type'])
+            results = run_load(options['url'], files, options['users'], options['iterations'], options['pid'])
+
+        def line(name, summary):
+            if not summary['count']:
+                return name.ljust(12) + 'no requests'
+            return name.ljust(12) + (
+                f"n {summary['count']}, errors {summary['error_rate']:.1%}, "
+                f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms"
+            )
+
+        self.stdout.write(f"{results['users']} users x {results['iterations']} flows in {results['seconds']:.1f} s")
+        for step in STEPS:
+            self.stdout.write(line(step, results['steps'][step]))
+        self.stdout.write(line('flow', results['flow']))
+        self.stdout.write(f"throughput  {results['flows_per_second']:.2f} flows/s, {results['requests_per_second']:.2f} requests/s")
+        for pid, memory in results['worker_rss_mb'].items():
+            self.stdout.write(f"worker {pid}".ljust(12) + f"max rss {memory['max']:.0f} MB, peak rss {memory['peak'] or 0:.0f} MB")
+
+        if options['output']:
+            with open(options['output'], 'a') as out:
+                out.write(json.dumps(results) + '\n')
@@ -0,0 +1,53 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Process a cohort of sessions listed in a manifest csv with the columns session, data and mvc '
+        '(paths relative to the manifest) and optionally channels (separated by ";"), time and event. '
+        'Sessions already present in the output directory are skipped, so an interrupted run can be resumed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Manifest csv file.')
+        parser.add_argument('outdir', help='Directory for the per session outputs and the cohort tables.')
+        parser.add_argument('--processes', type=int, help='Number of worker processes, defaults to the number of CPUs.')
+        parser.add_argument('--max-memory-mb', type=int, help='Address space limit of every worker process.')
+        parser.add_argument('--channels', help='Default channel column names, separated by ";".')
+        parser.add_argument('--time', help='Default time column name.')
+        parser.add_argument('--event', help='Default event column name.')
+
+    def handle(self, *args, **options):
+        # Imported here to keep pandas out of every other management command.
+        from data.src.cohort import run_cohort
+
+        root = os.path.dirname(os.path.abspath(options['manifest']))
+        tasks = []
+        with open(options['manifest'], newline='') as manifest:
+            for row in csv.DictReader(manifest):
+                channels = row.get('channels') or options['channels']
+                timeName = row.get('time') or options['time']
+                eventName = row.get('event') or options['event']
+                if not (channels and timeName and eventName):
+                    raise CommandError('Missing column names for session: ' + row['session'])
+
+                tasks.append({
+                    'session': row['session'],
+                    'data': os.path.join(root, row['data']),
+                    'mvc': os.path.join(root, row['mvc']),
+                    'tags': {
+                        'channelNames': channels.split(';'),
+                        'timeName': timeName,
+                        'eventName': eventName,
+                        'calibration': {},
+                    },
+                })
+
+        maxBytes = options['max_memory_mb'] * 1024 * 1024 if options['max_memory_mb'] else None
+        failed = run_cohort(tasks, options['outdir'], options['processes'], maxBytes, log=self.stdout.write)
+
+        if failed:
+            raise CommandError(f'{len(failed)} session(s) failed: ' + ', '.join(failed))
@@ -0,0 +1,131 @@
+"""
+Process-wide memory budget for the datasets held between requests.
+
+Raw uploads, their processed copies and the interval indexes built from them are stored in one DatasetManager under a
+key. Their size is measured when they are stored; once the total is over the budget (IRON_HANDMAIDENS_MEMORY_MB,
+1024 MB by default) the least recently used ones are pickled to files in a spill directory and loaded again the next
+time they are requested. Objects still referenced elsewhere, for example during a request, are only freed once those
+references are gone.
+"""
+import atexit
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def nbytes(obj, seen: set=None) -> int:
+    """Approximate memory held by obj: DataFrames, Series and numpy arrays, followed through containers and attributes."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'columns'):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'index'):
+        return int(obj.memory_usage(index=True, deep=True))
+    if hasattr(obj, 'nbytes') and hasattr(obj, 'dtype'):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(nbytes(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(value, seen) for value in obj)
+    if hasattr(obj, '__dict__'):
+        return nbytes(vars(obj), seen)
+    return 0
+
+
+class DatasetManager:
+    """Least recently used store of datasets within a byte budget, spilling the rest to disk."""
+
+    def __init__(self, budget: int, directory: str=None):
+        self.budget = budget
+        self.directory = directory
+        self.loaded = OrderedDict()
+        self.sizes = {}
+        self.spilled = {}
+        self.evictions = 0
+        self.reloads = 0
+        self.lock = threading.RLock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.loaded or key in self.spilled
+
+    @property
+    def usage(self) -> int:
+        return sum(self.sizes[key] for key in self.loaded)
+
+    def put(self, key: str, obj) -> None:
+        """Store obj under key, replacing any earlier object, and evict others if this goes over the budget."""
+        with self.lock:
+            self.discard(key)
+            self.loaded[key] = obj
+            self.sizes[key] = nbytes(obj)
+            self.enforce(keep=key)
+
+    def get(self, key: str):
+        """The object stored under key, loaded from disk if it was spilled. Raises KeyError for unknown keys."""
+        with self.lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                return self.loaded[key]
+
+            path = self.spilled.pop(key)
+            with open(path, 'rb') as file:
+                obj = pickle.load(file)
+            os.remove(path)
+            self.loaded[key] = obj
+            self.reloads += 1
+            self.enforce(keep=key)
+            return obj
+
+    def discard(self, key: str) -> None:
+        """Forget key, in memory or on disk. Unknown keys are ignored."""
+        with self.lock:
+            self.loaded.pop(key, None)
+            path = self.spilled.pop(key, None)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+            self.sizes.pop(key, None)
+
+    def enforce(self, keep: str=None) -> None:
+        """Spill the least recently used objects until the loaded ones fit the budget. keep is never spilled."""
+        with self.lock:
+            usage = self.usage
+            for key in list(self.loaded):
+                if usage <= self.budget:
+                    break
+                if key == keep:
+                    continue
+                self.spill(key)
+                usage -= self.sizes[key]
+
+    def spill(self, key: str) -> None:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='iron_handmaidens-')
+            atexit.register(shutil.rmtree, self.directory, True)
+
+        path = os.path.join(self.directory, f'{os.getpid()}-{self.evictions}.pickle')
+        with open(path, 'wb') as file:
+            pickle.dump(self.loaded.pop(key), file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled[key] = path
+        self.evictions += 1
+
+    def stats(self) -> dict:
+        """Budget and usage in bytes, the number of loaded and spilled objects, and the eviction and reload counts."""
+        with self.lock:
+            return {
+                'budget_bytes': self.budget,
+                'usage_bytes': self.usage,
+                'spilled_bytes': sum(self.sizes[key] for key in self.spilled),
+                'loaded': len(self.loaded),
+                'spilled': len(self.spilled),
+                'evictions': self.evictions,
+                'reloads': self.reloads,
+            }
+
+
+datasets = DatasetManager(int(float(os.environ.get('IRON_HANDMAIDENS_MEMORY_MB', 1024)) * 1024 * 1024), os.environ.get('IRON_HANDMAIDENS_SPILL_DIR'))
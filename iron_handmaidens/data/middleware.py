@@ -0,0 +1,99 @@
+"""
+Response compression with brotli (when the optional brotli package is installed) or gzip.
+
+Compressed bodies of responses carrying an ETag are kept in a small cache, so sending the
+same page or JSON again to another client does not compress it again.
+
+Like Django's GZipMiddleware, gzip bodies get up to MAX_RANDOM_BYTES random bytes in their
+header, so their length does not reveal secrets on the page (BREACH). Brotli has no such
+padding, so responses that used the CSRF token are only sent with gzip.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_TYPES = ('text/html', 'application/json', 'text/csv')
+BR_RE = re.compile(r'\bbr\b')
+GZIP_RE = re.compile(r'\bgzip\b')
+MAX_RANDOM_BYTES = 100
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return compress_string(body, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+class CompressionMiddleware:
+    """Compress HTML, JSON and csv responses, preferring brotli over gzip."""
+
+    minimumSize = 200
+    cacheSize = 32
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming or response.has_header('Content-Encoding') or len(response.content) < self.minimumSize:
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() not in COMPRESSED_TYPES:
+            return response
+
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        # CsrfViewMiddleware sets the CSRF cookie again on every response that used the token
+        secret = settings.CSRF_COOKIE_NAME in response.cookies
+        if brotli is not None and not secret and BR_RE.search(accepted):
+            encoding = 'br'
+        elif GZIP_RE.search(accepted):
+            encoding = 'gzip'
+        else:
+            return response
+
+        etag = response.get('ETag')
+        body = self.cached(etag, encoding)
+        if body is None:
+            body = compress(response.content, encoding)
+            self.store(etag, encoding, body)
+
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # The compressed body is a different representation, so the validator can only be a weak one
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        return response
+
+    def cached(self, etag: str, encoding: str) -> bytes:
+        if not etag:
+            return None
+        with self.lock:
+            body = self.cache.get((etag, encoding))
+            if body is not None:
+                self.cache.move_to_end((etag, encoding))
+            return body
+
+    def store(self, etag: str, encoding: str, body: bytes) -> None:
+        if not etag:
+            return
+        with self.lock:
+            self.cache[(etag, encoding)] = body
+            while len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Session',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(help_text='Hash of the raw data and processing parameters.', max_length=64, unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('frequency', models.FloatField()),
+                ('samples', models.PositiveIntegerField()),
+                ('duration', models.FloatField(help_text='Seconds')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('start', models.FloatField(help_text='Seconds from the start of the session')),
+                ('stop', models.FloatField(help_text='Seconds from the start of the session')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='data.session')),
+            ],
+            options={
+                'ordering': ['session', 'number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Channel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('mvcMin', models.FloatField(null=True)),
+                ('mvcMax', models.FloatField(null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='channels', to='data.session')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Statistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('value', models.FloatField(null=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='data.channel')),
+                ('event', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='data.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'value'], name='data_statis_kind_ae9326_idx'), models.Index(fields=['channel', 'kind'], name='data_statis_channel_47024d_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('session', 'number'), name='unique_event_per_session'),
+        ),
+        migrations.AddConstraint(
+            model_name='channel',
+            constraint=models.UniqueConstraint(fields=('session', 'name'), name='unique_channel_per_session'),
+        ),
+    ]
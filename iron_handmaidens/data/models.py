@@ -1,3 +1,57 @@
 from django.db import models
 
-# Create your models here.
+
+class Session(models.Model):
+    """One processed upload, possibly merged from several sensors."""
+    name = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, unique=True, help_text='Hash of the raw data and processing parameters.')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    frequency = models.FloatField()
+    samples = models.PositiveIntegerField()
+    duration = models.FloatField(help_text='Seconds')
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return self.name
+
+
+class Channel(models.Model):
+    """A raw or derived channel of a session, with the MVC calibration of the raw channel it comes from."""
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='channels')
+    name = models.CharField(max_length=255, db_index=True)
+    mvcMin = models.FloatField(null=True)
+    mvcMax = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['session', 'name'], name='unique_channel_per_session')]
+
+    def __str__(self):
+        return self.name
+
+
+class Event(models.Model):
+    """An event marked during a session, numbered in the order of EMGData.find_events."""
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='events')
+    number = models.PositiveIntegerField()
+    start = models.FloatField(help_text='Seconds from the start of the session')
+    stop = models.FloatField(help_text='Seconds from the start of the session')
+
+    class Meta:
+        ordering = ['session', 'number']
+        constraints = [models.UniqueConstraint(fields=['session', 'number'], name='unique_event_per_session')]
+
+
+class Statistic(models.Model):
+    """A summary value of one channel over the whole session (event is empty) or over one event."""
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='statistics')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='statistics', null=True)
+    kind = models.CharField(max_length=32)
+    value = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'value']),
+            models.Index(fields=['channel', 'kind']),
+        ]
@@ -0,0 +1,33 @@
+"""
+Warm start for forking servers.
+
+The views import pandas, SciPy and plotly on first use so that workers start quickly. When the
+application is loaded once in a master process before forking (for example gunicorn --preload),
+setting IRON_HANDMAIDENS_PRELOAD=1 imports them up front instead, so every forked worker
+shares the already imported modules and none of them pays the cost on its first request.
+"""
+import importlib
+import os
+
+HEAVY_MODULES = [
+    'numpy',
+    'pandas',
+    'scipy.io',
+    'scipy.signal',
+    'plotly.graph_objs',
+    'plotly.offline',
+    'data.src.emg',
+]
+
+
+def enabled() -> bool:
+    return os.environ.get('IRON_HANDMAIDENS_PRELOAD') == '1'
+
+
+def preload(modules: list=HEAVY_MODULES) -> None:
+    """Import the heavy modules and build an empty figure so plotly's trace validators are loaded too."""
+    for name in modules:
+        importlib.import_module(name)
+
+    import plotly.graph_objs as go
+    go.Figure([go.Scatter(), go.Scattergl()])
@@ -0,0 +1,79 @@
+"""
+Saving processed sessions to the database, so past sessions can be searched and compared without their raw files.
+"""
+import math
+import warnings
+
+from django.db import transaction
+
+from data.models import Channel, Event, Session, Statistic
+
+
+def calibration(data: 'EMGData', channel: str) -> tuple:
+    """MVC (min, max) of the raw channel a raw or derived channel comes from, or (None, None) if it has none."""
+    bounds = data.calibration.get(data.base_channel(channel))
+    if bounds is None:
+        return None, None
+    return tuple(float(bound) for bound in bounds)
+
+
+def number(value) -> float:
+    return float(value) if math.isfinite(value) else None
+
+
+@transaction.atomic
+def save_session(name: str, raw: 'EMGData', processed: 'EMGData', fingerprint: str) -> Session:
+    """
+    Save a processed session with its channels, events and summary statistics, written with one bulk insert per table.
+
+    The statistics of every channel are its percentiles during events (as in the percentile table) and its mean and
+    max over the whole session, plus the mean and max within every event. A session whose fingerprint is already
+    saved is returned as it is.
+    """
+    # Imported here so that importing the views does not load numpy, see check_import_time
+    import numpy as np
+
+    existing = Session.objects.filter(fingerprint=fingerprint).first()
+    if existing is not None:
+        return existing
+
+    time = processed.time.to_numpy()
+    session = Session.objects.create(
+        name=name[:255],
+        fingerprint=fingerprint,
+        frequency=processed.frequency,
+        samples=len(processed.df),
+        duration=float(time[-1] - time[0]) if len(time) else 0,
+    )
+
+    columns = processed.channelNames
+    Channel.objects.bulk_create([
+        Channel(session=session, name=col, mvcMin=calibration(raw, col)[0], mvcMax=calibration(raw, col)[1]) for col in columns
+    ])
+    channels = {channel.name: channel for channel in session.channels.all()}
+
+    bounds = processed.event_bounds()
+    Event.objects.bulk_create([
+        Event(session=session, number=idx, start=float(time[start]), stop=float(time[stop])) for idx, (start, stop) in enumerate(bounds)
+    ])
+    events = list(session.events.all())
+
+    statistics = []
+    percentiles = processed.percentiles(columns=columns)
+    for _, row in percentiles.iterrows():
+        for col in columns:
+            statistics.append(Statistic(channel=channels[col], kind=row['Percentile'], value=number(row[col])))
+
+    values = processed.df[columns].to_numpy(dtype='float64')
+    with warnings.catch_warnings():
+        # Columns that are empty within an event, such as the start of a rolling window, give None
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for event, rows in [(None, slice(None))] + [(event, slice(start, stop + 1)) for event, (start, stop) in zip(events, bounds)]:
+            means = np.nanmean(values[rows], axis=0)
+            peaks = np.nanmax(values[rows], axis=0)
+            for idx, col in enumerate(columns):
+                statistics.append(Statistic(channel=channels[col], event=event, kind='Mean', value=number(means[idx])))
+                statistics.append(Statistic(channel=channels[col], event=event, kind='Max', value=number(peaks[idx])))
+
+    Statistic.objects.bulk_create(statistics, batch_size=1000)
+    return session
@@ -0,0 +1,201 @@
+import os
+import shutil
+import traceback
+import multiprocessing
+
+import pandas as pd
+
+from data.src.emg import EMGData
+
+PERCENTILES_FILE = 'percentiles.csv'
+RMS_FILE = 'rms_summary.csv'
+
+
+def read_session(path: str, tags: dict) -> EMGData:
+	"""
+	# Read a csv or mat file into an EMGData object.
+
+	Parameters
+	---
+	path : str
+		Path to the csv or mat file.
+	tags : dict
+		Keyword arguments passed to EMGData.read_csv or EMGData.read_mat.
+
+	Returns
+	---
+	data : EMGData
+		EMG data from the file.
+
+	Raises
+	---
+	ValueError
+		The file is neither a csv nor a mat file.
+	"""
+	extension = os.path.splitext(path)[1].lower()
+	if extension == '.csv':
+		return EMGData.read_csv(path, **tags)
+	elif extension == '.mat':
+		return EMGData.read_mat(path, **tags)
+	raise ValueError('Unsupported file type: ' + path)
+
+
+def rms_summary(data: EMGData) -> pd.DataFrame:
+	"""
+	# Summarize the RMS channels of preprocessed data.
+
+	Parameters
+	---
+	data : EMGData
+		Preprocessed EMG data.
+
+	Returns
+	---
+	summary : pd.DataFrame
+		One row per RMS channel with its mean and maximum over the whole session and its percentiles during events.
+	"""
+	columns = data.find_columns(['RMS'])
+	percentiles = data.percentiles(columns=columns).set_index('Percentile').T
+
+	summary = pd.DataFrame({
+		'Channel': columns,
+		'Mean': data.df[columns].mean().to_numpy(),
+		'Max': data.df[columns].max().to_numpy(),
+	})
+	for name in percentiles.columns:
+		summary[name] = percentiles[name].to_numpy()
+
+	return summary
+
+
+def session_dir(outdir: str, session: str) -> str:
+	return os.path.join(outdir, session)
+
+
+def is_done(outdir: str, session: str) -> bool:
+	"""A session is finished once its output directory exists, as it is only renamed into place after all files are written."""
+	return os.path.isdir(session_dir(outdir, session))
+
+
+def process_session(task: dict) -> tuple:
+	"""
+	# Process one session and write its percentile table and RMS summary.
+	Runs inside a worker process. Outputs are written to a temporary directory that is renamed into place at the end,
+	so a crash never leaves a half written session behind.
+
+	Parameters
+	---
+	task : dict
+		Session name, data and mvc file paths, column names (tags) and output directory.
+
+	Returns
+	---
+	result : tuple
+		Session name and None on success, or the formatted exception on failure.
+	"""
+	session = task['session']
+	final = session_dir(task['outdir'], session)
+	partial = final + '.partial'
+
+	try:
+		data = read_session(task['data'], task['tags'])
+		mvc = read_session(task['mvc'], task['tags'])
+		data.calibrate(mvc.min_max())
+		del mvc
+
+		percentiles = data.percentiles()
+		processed = data.preprocess(tierRates=None)
+		del data
+		summary = rms_summary(processed)
+		del processed
+
+		shutil.rmtree(partial, ignore_errors=True)
+		os.makedirs(partial)
+		percentiles.to_csv(os.path.join(partial, PERCENTILES_FILE), index=False)
+		summary.to_csv(os.path.join(partial, RMS_FILE), index=False)
+		os.replace(partial, final)
+	except Exception:
+		shutil.rmtree(partial, ignore_errors=True)
+		return session, traceback.format_exc()
+
+	return session, None
+
+
+def limit_memory(maxBytes: int) -> None:
+	"""Worker initializer capping the address space of the process, so one huge session fails alone instead of exhausting the machine."""
+	if maxBytes:
+		import resource
+		resource.setrlimit(resource.RLIMIT_AS, (maxBytes, maxBytes))
+
+
+def aggregate(outdir: str, sessions: list, fileName: str) -> pd.DataFrame:
+	"""
+	# Concatenate one output table of every finished session into a cohort table.
+
+	Parameters
+	---
+	outdir : str
+		Output directory of the cohort.
+	sessions : list
+		Session names, in manifest order.
+	fileName : str
+		Name of the per session table to aggregate.
+
+	Returns
+	---
+	cohort : pd.DataFrame
+		The session tables stacked with a leading Session column.
+	"""
+	tables = []
+	for session in sessions:
+		path = os.path.join(session_dir(outdir, session), fileName)
+		if os.path.exists(path):
+			table = pd.read_csv(path)
+			table.insert(0, 'Session', session)
+			tables.append(table)
+
+	return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def run_cohort(tasks: list, outdir: str, processes: int=None, maxBytes: int=None, log=print) -> list:
+	"""
+	# Process every unfinished session of a cohort in a process pool and write the aggregated tables.
+
+	Parameters
+	---
+	tasks : list
+		Task dicts as accepted by process_session, without the output directory.
+	outdir : str
+		Directory receiving one sub directory per session plus the cohort tables.
+	processes : int, default os.cpu_count()
+		Number of worker processes.
+	maxBytes : int, default unlimited
+		Address space limit of every worker process.
+	log : callable, default print
+		Receives one progress line per session.
+
+	Returns
+	---
+	failed : list
+		Names of the sessions that could not be processed. They are retried on the next run.
+	"""
+	os.makedirs(outdir, exist_ok=True)
+	sessions = [task['session'] for task in tasks]
+	pending = [dict(task, outdir=outdir) for task in tasks if not is_done(outdir, task['session'])]
+	log(f'{len(tasks) - len(pending)} of {len(tasks)} sessions already processed')
+
+	failed = []
+	if pending:
+		# Workers are replaced after every session so that memory held by one session is returned to the system.
+		with multiprocessing.Pool(processes, initializer=limit_memory, initargs=(maxBytes,), maxtasksperchild=1) as pool:
+			for session, error in pool.imap_unordered(process_session, pending):
+				if error is None:
+					log('Processed'.ljust(20) + session)
+				else:
+					log('Failed'.ljust(20) + session + '\n' + error)
+					failed.append(session)
+
+	aggregate(outdir, sessions, PERCENTILES_FILE).to_csv(os.path.join(outdir, 'cohort_' + PERCENTILES_FILE), index=False)
+	aggregate(outdir, sessions, RMS_FILE).to_csv(os.path.join(outdir, 'cohort_' + RMS_FILE), index=False)
+
+	return failed
@@ -1,5 +1,4 @@
 import os.path
-import scipy.io
 import pandas as pd
 
 class Converter():
@@ -38,6 +37,8 @@ class Converter():
 			print('Skipping'.ljust(20) + infile)
 			return
 
+		import scipy.io
+
 		try:
 			mat = scipy.io.loadmat(infile)
 		except ValueError as err:
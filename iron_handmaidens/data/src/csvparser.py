@@ -0,0 +1,103 @@
+import io
+import csv
+import codecs
+
+import numpy as np
+import pandas as pd
+
+
+class IncrementalCSVParser:
+	"""
+	Parse csv text that arrives in chunks. Complete lines are parsed in batches with the pandas C parser and only the
+	selected columns are kept, as float64 arrays. Malformed input raises ValueError as soon as the offending batch is seen.
+	"""
+
+	maxHeaderBytes = 1 << 16
+
+	def __init__(self, columns: list=None, batchBytes: int=1 << 20) -> None:
+		self.columns = columns
+		self.batchBytes = batchBytes
+
+		self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+		self.buffer = ''
+		self.names = None
+		self.chunks = {}
+		self.rows = 0
+
+	def feed(self, data: bytes) -> None:
+		"""
+		# Add the next chunk of raw bytes.
+
+		Parameters
+		---
+		data : bytes
+			Next part of the file, may end anywhere including inside a line or a multibyte character.
+
+		Raises
+		---
+		ValueError
+			The header is missing a selected column, or a line could not be parsed as numbers.
+		"""
+		self.buffer += self.decoder.decode(data)
+
+		if self.names is None:
+			newline = self.buffer.find('\n')
+			if newline == -1:
+				if len(self.buffer) > self.maxHeaderBytes:
+					raise ValueError('No header line found')
+				return
+			self._read_header(self.buffer[:newline])
+			self.buffer = self.buffer[newline + 1:]
+
+		if len(self.buffer) >= self.batchBytes:
+			cut = self.buffer.rfind('\n') + 1
+			if cut:
+				self._parse(self.buffer[:cut])
+				self.buffer = self.buffer[cut:]
+
+	def close(self) -> dict:
+		"""
+		# Parse whatever is left and return the selected columns.
+
+		Returns
+		---
+		columns : dict
+			Mapping of column name to a float64 numpy array.
+
+		Raises
+		---
+		ValueError
+			The file was empty or its last lines were malformed.
+		"""
+		self.buffer += self.decoder.decode(b'', final=True)
+		if self.names is None:
+			if not self.buffer.strip():
+				raise ValueError('The file is empty')
+			self._read_header(self.buffer)
+			self.buffer = ''
+
+		if self.buffer.strip():
+			self._parse(self.buffer)
+		self.buffer = ''
+
+		return {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in self.chunks.items()}
+
+	def _read_header(self, line: str) -> None:
+		self.names = next(csv.reader([line.rstrip('\r')]))
+		wanted = self.columns or self.names
+
+		missing = [name for name in wanted if name not in self.names]
+		if missing:
+			raise ValueError('Column(s) could not be found: ' + ', '.join(missing))
+
+		self.chunks = {name: [] for name in wanted}
+
+	def _parse(self, text: str) -> None:
+		try:
+			batch = pd.read_csv(io.StringIO(text), header=None, names=self.names, usecols=list(self.chunks), dtype='float64')
+		except (ValueError, pd.errors.ParserError) as err:
+			raise ValueError(f'Malformed csv after row {self.rows}: {err}')
+
+		for name, chunks in self.chunks.items():
+			chunks.append(batch[name].to_numpy())
+		self.rows += len(batch)
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def stages(factor: int, maxStage: int=8) -> list:
+	"""Split an integer decimation factor into a product of stages of at most maxStage where possible, largest first."""
+	if factor < 1 or int(factor) != factor:
+		raise ValueError('Decimation factor must be a positive integer: ' + str(factor))
+
+	result = []
+	remaining = int(factor)
+	while remaining > 1:
+		for stage in range(min(maxStage, remaining), 1, -1):
+			if remaining % stage == 0:
+				break
+		else:
+			stage = remaining
+		result.append(stage)
+		remaining //= stage
+	return result
+
+
+def fill_missing(signal: np.ndarray) -> np.ndarray:
+	"""Replace empty (NaN) samples with the last value before them, or the first value after them at the start."""
+	missing = np.isnan(signal)
+	if not missing.any():
+		return signal
+
+	rows = np.arange(len(signal))[:, None]
+	last = np.maximum.accumulate(np.where(missing, -1, rows), axis=0)
+	first = np.argmax(~missing, axis=0)
+	last = np.where(last < 0, first, last)
+	return np.nan_to_num(np.take_along_axis(signal, last, axis=0))
+
+
+def decimate(signal, factor: int) -> np.ndarray:
+	"""
+	# Reduce the sampling rate of every channel by an integer factor without aliasing.
+	Each stage of at most 8 low pass filters the signal with an order 8 Chebyshev type I filter at 80% of the new
+	Nyquist frequency, run forwards and backwards so the output has no phase delay, and keeps every stage-th sample.
+	The filter is scaled to a gain of exactly 1 at 0 Hz, so slowly varying envelopes keep their level.
+	The output samples are at the same times as signal[::factor].
+
+	Parameters
+	---
+	signal : array-like
+		Samples by channels array, or a single channel.
+	factor : int
+		Ratio of the input to the output sampling rate.
+
+	Returns
+	---
+	decimated : np.ndarray
+		Decimated signal. Samples taken where the input was empty (NaN), such as the start of a rolling window,
+		stay empty.
+	"""
+	from scipy.signal import cheby1, sosfiltfilt
+
+	signal = np.asarray(signal, dtype='float64')
+	single = signal.ndim == 1
+	if single:
+		signal = signal[:, None]
+
+	missing = np.isnan(signal)[::factor]
+	for stage in stages(factor):
+		if len(signal) > 1:
+			sos = cheby1(8, 0.05, 0.8 / stage, output='sos')
+			sos[0, :3] /= np.prod(sos[:, :3].sum(axis=1) / sos[:, 3:].sum(axis=1))
+			signal = sosfiltfilt(sos, fill_missing(signal), axis=0, padlen=min(len(signal) - 1, 3 * (2 * len(sos) + 1)))
+		signal = signal[::stage]
+
+	signal[missing] = np.nan
+	return signal[:, 0] if single else signal
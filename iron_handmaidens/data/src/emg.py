@@ -1,17 +1,30 @@
+from __future__ import annotations
+
+import json
+import uuid
+import hashlib
+from base64 import b64encode
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 from copy import deepcopy
-from scipy.signal import butter, sosfilt
-import plotly.graph_objs as go
-from plotly.offline import plot as plotly_plot
 
 from data.src.converter import Converter
+from data.src.spectral import spectral_frequencies
+from data.src import decimation, sync
+
+# SciPy signal and plotly are imported where they are first used, they dominate the import time of this module.
+if TYPE_CHECKING:
+	import plotly.graph_objs as go
 
 class EMGData:
 	"""
 	Organize, process, and plot EMG data. Data is stored in a pandas DataFrame.
 	"""
 
-	def __init__(self, df, channelNames: list, timeName: str, eventName: str, frequency: float, maxDataPoints: int, windowTime: float,  min_max_list: list) -> None:
+	def __init__(self, df, channelNames: list, timeName: str, eventName: str, frequency: float, maxDataPoints: int, windowTime: float, calibration: dict) -> None:
 		self.df = df
 
 		self.channelNames = channelNames
@@ -21,10 +34,19 @@ class EMGData:
 		self.frequency = frequency
 		self.maxDataPoints = int(maxDataPoints)
 		self.windowTime = windowTime
-		self.min_max_list = min_max_list
+		# MVC (min, max) of every original channel by name, see calibrate
+		self.calibration = dict(calibration or {})
+
+		# Caches for the time and event indexes, see sorted_time and event_bounds
+		self._sortedTime = None
+		self._eventBounds = {}
+		# Offset and drift estimated when this object was merged with alignment, see merge
+		self.syncReport = None
+		# Lower rate copies of the envelope channels by their sampling rate, see decimation_tiers
+		self.tiers = {}
 
 	@classmethod
-	def read_csv(cls, csv: str or object, channelNames: list, timeName: str, eventName: str,  min_max_list: list, frequency: float=1024, maxDataPoints: int=1000, windowTime: float=1) -> 'EMGData':
+	def read_csv(cls, csv: str or object, channelNames: list, timeName: str, eventName: str, calibration: dict, frequency: float=1024, maxDataPoints: int=1000, windowTime: float=1) -> 'EMGData':
 		"""
 		# Create EMGData object from a csv file.
 
@@ -38,6 +60,8 @@ class EMGData:
 			Name of column containing time data.
 		eventName : str
 			Name of column containing event data.
+		calibration : dict
+			MVC (min, max) of the channels by name, may be empty until calibrate is called.
 		frequency : float, default 1024
 			Sampling rate of EMG data in Hz.
 		maxDataPoints : int, default 1000
@@ -52,10 +76,10 @@ class EMGData:
 		"""
 		df = pd.read_csv(csv)
 
-		return cls(df, channelNames, timeName, eventName, frequency, maxDataPoints, windowTime, min_max_list)
+		return cls(df, channelNames, timeName, eventName, frequency, maxDataPoints, windowTime, calibration)
 
 	@classmethod
-	def read_mat(cls, mat: str or object, channelNames: list, timeName: str, eventName: str, min_max_list: list, frequency: float=1024, maxDataPoints: int=1000, windowTime: float=1) -> 'EMGData':
+	def read_mat(cls, mat: str or object, channelNames: list, timeName: str, eventName: str, calibration: dict, frequency: float=1024, maxDataPoints: int=1000, windowTime: float=1) -> 'EMGData':
 		"""
 		# Create EMGData object from a mat file.
 
@@ -69,6 +93,8 @@ class EMGData:
 			Name of column containing time data.
 		eventName : str
 			Name of column containing event data.
+		calibration : dict
+			MVC (min, max) of the channels by name, may be empty until calibrate is called.
 		frequency : float, default 1024
 			Sampling rate of EMG data in Hz.
 		maxDataPoints : int, default 1000
@@ -83,7 +109,40 @@ class EMGData:
 		"""
 		df = Converter().mat_to_df(mat).astype(float)
 
-		return cls(df, channelNames, timeName, eventName, frequency, maxDataPoints, windowTime, min_max_list)
+		return cls(df, channelNames, timeName, eventName, frequency, maxDataPoints, windowTime, calibration)
+
+	@classmethod
+	def from_columns(cls, columns: dict, channelNames: list, timeName: str, eventName: str, calibration: dict, frequency: float=1024, maxDataPoints: int=1000, windowTime: float=1) -> 'EMGData':
+		"""
+		# Create EMGData object from already parsed columns, such as an upload parsed by the streaming upload handler.
+
+		Parameters
+		---
+		columns : dict
+			Mapping of column name to an array of values.
+		channelNames : list
+			List of column names for EMG data channels.
+		timeName : str
+			Name of column containing time data.
+		eventName : str
+			Name of column containing event data.
+		calibration : dict
+			MVC (min, max) of the channels by name, may be empty until calibrate is called.
+		frequency : float, default 1024
+			Sampling rate of EMG data in Hz.
+		maxDataPoints : int, default 1000
+			Maximum number of data points to be DISPLAYED by plots/figures; this will not affect the number of data points stored in the object.
+		windowTime : float, default 1
+			Time in seconds for moving average window.
+
+		Returns
+		---
+		data : EMGData
+			EMG data from the columns contained in EMGData object.
+		"""
+		df = pd.DataFrame(columns)
+
+		return cls(df, channelNames, timeName, eventName, frequency, maxDataPoints, windowTime, calibration)
 
 	def copy(self) -> 'EMGData':
 		"""
@@ -106,7 +165,26 @@ class EMGData:
 						frequency=deepcopy(self.frequency),
 						maxDataPoints=deepcopy(self.maxDataPoints),
 						windowTime=deepcopy(self.windowTime),
-						min_max_list=deepcopy(self.min_max_list))
+						calibration=deepcopy(self.calibration))
+
+	def fingerprint(self, *params) -> str:
+		"""
+		# Content hash of the data, its column roles and any processing parameters.
+
+		Parameters
+		---
+		params
+			Extra values that change the processing results, such as window lengths.
+
+		Returns
+		---
+		fingerprint : str
+			Hex sha256 digest. Equal data and parameters always give the same fingerprint.
+		"""
+		digest = hashlib.sha256()
+		digest.update(pd.util.hash_pandas_object(self.df, index=False).to_numpy().tobytes())
+		digest.update(repr((list(self.df.columns), self.channelNames, self.timeName, self.eventName, self.frequency, self.windowTime, sorted(self.calibration.items()), params)).encode())
+		return digest.hexdigest()
 
 	def __repr__(self) -> str:
 		"""The class represended as a string."""
@@ -154,6 +232,9 @@ class EMGData:
 	@time.setter
 	def time(self, data: int or float or pd.Series) -> None:
 		self.df[self.timeName] = data
+		# The cached indexes describe the replaced column
+		self._sortedTime = None
+		self._eventBounds = {}
 
 	@property
 	def event(self) -> pd.Series:
@@ -163,6 +244,12 @@ class EMGData:
 	@event.setter
 	def event(self, data: int or float or pd.Series) -> None:
 		self.df[self.eventName] = data
+		self._sortedTime = None
+		self._eventBounds = {}
+
+	def elapsed(self) -> pd.Series:
+		"""Time since the first sample in seconds, from the time column in ms."""
+		return self.time.diff().fillna(0).cumsum() / 1000
 
 	def find_columns(self, names: str or list) -> list:
 		"""
@@ -198,7 +285,65 @@ class EMGData:
 
 		return columns
 
-	def merge(self, other: 'EMGData') -> 'EMGData':
+	def align(self, other: 'EMGData', using: str='event', maxLag: float=None) -> tuple:
+		"""
+		# Synchronize another recording to this one, correcting the clock offset and drift between the two sensors.
+		The offset is estimated by FFT cross-correlation of the two recordings (see sync.estimate_sync), then every
+		column of the other recording is resampled onto this recording's time grid. Time is assumed to be in ms.
+
+		Parameters
+		---
+		other : EMGData
+			EMGData object to align to this one.
+		using : str, default 'event'
+			'event' to align on the event marker columns, or 'envelope' to align on the rectified and smoothed channels.
+		maxLag : float, default any lag
+			Largest offset in seconds that is considered.
+
+		Returns
+		---
+		aligned : EMGData
+			Copy of the other object sampled on this object's timestamps, limited to the time both recordings overlap.
+			Its time column holds exactly this object's timestamps.
+		sync : dict
+			Estimated offset (ms), drift (ms per ms) and peak correlation, see sync.estimate_sync.
+
+		Raises
+		---
+		ValueError
+			Unknown alignment signal.
+		"""
+		if using == 'event':
+			refSignal, otherSignal = self.event.to_numpy(dtype='float64'), other.event.to_numpy(dtype='float64')
+		elif using == 'envelope':
+			refSignal = sync.envelope(self.channels.to_numpy(), int(0.1 // self.period))
+			otherSignal = sync.envelope(other.channels.to_numpy(), int(0.1 // other.period))
+		else:
+			raise ValueError('Unknown alignment signal: ' + str(using))
+
+		step = self.period * 1000
+		refTime = self.sorted_time().astype('float64')
+		otherTime = other.sorted_time().astype('float64')
+		report = sync.estimate_sync(refTime, refSignal, otherTime, otherSignal, step, None if maxLag is None else int(maxLag * 1000 / step))
+
+		mapped = sync.map_time(otherTime, report)
+		grid = refTime[(refTime >= mapped[0]) & (refTime <= mapped[-1])]
+
+		# Event markers are categories, so they take the nearest sample instead of being interpolated
+		nearest = np.rint(np.interp(grid, mapped, np.arange(len(mapped)))).astype('int64')
+		df = pd.DataFrame(index=range(len(grid)))
+		for col in other.df.columns:
+			if col == other.timeName:
+				df[col] = grid
+			elif col == other.eventName or not pd.api.types.is_numeric_dtype(other.df[col]):
+				df[col] = other.df[col].to_numpy()[nearest]
+			else:
+				df[col] = np.interp(grid, mapped, other.df[col].to_numpy(dtype='float64'))
+
+		aligned = EMGData(df, list(other.channelNames), other.timeName, other.eventName, other.frequency, other.maxDataPoints, other.windowTime, deepcopy(other.calibration))
+		return aligned, report
+
+	def merge(self, other: 'EMGData', align: bool=False, using: str='event') -> 'EMGData':
 		"""
 		# Merge two sets of EMG data together.
 
@@ -206,6 +351,11 @@ class EMGData:
 		---
 		other : EMGData
 			EMGData object to merge with.
+		align : bool, default False
+			Synchronize the other recording to this one before merging instead of relying on equal timestamps, see align.
+			The estimate is stored in the syncReport attribute of the merged object.
+		using : str, default 'event'
+			Signal used to align the recordings, see align.
 
 		Returns
 		---
@@ -215,7 +365,7 @@ class EMGData:
 		Raises
 		---
 		ValueError
-			The two dataframes are not compatible.
+			The two dataframes are not compatible, or they calibrate the same channel differently.
 		"""
 		if type(other) != EMGData:
 			raise TypeError('Trying to add something other than another dataframe')
@@ -224,13 +374,25 @@ class EMGData:
 		elif self.frequency != other.frequency:
 			raise ValueError('Samples collected with different frequency')
 
+		calibration = dict(self.calibration)
+		for channel, bounds in other.calibration.items():
+			if channel in calibration and tuple(calibration[channel]) != tuple(bounds):
+				raise ValueError('Conflicting MVC calibration for channel: ' + channel)
+			calibration[channel] = bounds
+
+		report = None
+		if align:
+			other, report = self.align(other, using)
+
 		left, right = self.df.copy(), other.df.copy()
-		for df, obj in [(left, self), (right, other)]:
-			df[obj.timeName] = obj.time.astype('int64')
-			df = df.drop_duplicates(obj.timeName)
+		# Aligned data already holds this object's exact timestamps
+		if not align:
+			for df, obj in [(left, self), (right, other)]:
+				df[obj.timeName] = obj.time.astype('int64')
+				df = df.drop_duplicates(obj.timeName)
 
 		df = pd.merge(left, right, 'inner', left_on=self.timeName, right_on=other.timeName)
-		new = EMGData(df, self.channelNames + other.channelNames, self.timeName, self.eventName, self.frequency, self.maxDataPoints, self.windowTime, self.min_max_list)
+		new = EMGData(df, self.channelNames + other.channelNames, self.timeName, self.eventName, self.frequency, self.maxDataPoints, self.windowTime, calibration)
 
 		timestamps = new.find_columns(['Timestamp'])
 		try:
@@ -245,21 +407,61 @@ class EMGData:
 					new.df = new.df.drop(col, axis=1)
 		if len(timestamps) > 1:
 			new.timeName = 'Timestamp'
+		new.syncReport = report
 
 		return new
 
-	def min_max(self):
+	def min_max(self) -> dict:
+		"""
+		# Find the minimum and maximum of every channel, such as those of an MVC recording.
 
-		min_max_df = self.df[self.df[self.eventName] == 2]
-		colNames = self.channelNames
-		min_max_list = []
+		Returns
+		---
+		min_max : dict
+			(min, max) of every channel by name, in the order of self.channelNames.
+		"""
+		values = self.channels.to_numpy(dtype='float64')
 
-		for col in colNames:
-			min = self.df[col].min()
-			max = self.df[col].max()
-			min_max_list.append((min, max))
+		return {col: (low, high) for col, low, high in zip(self.channelNames, np.nanmin(values, axis=0), np.nanmax(values, axis=0))}
+
+	def calibrate(self, bounds: dict) -> None:
+		"""
+		# Set the MVC calibration of the channels, pairing them by position with the channels of an MVC recording.
+
+		Parameters
+		---
+		bounds : dict
+			(min, max) of the MVC channels in the same order as self.channelNames, as returned by min_max of the MVC recording.
+
+		Raises
+		---
+		ValueError
+			The MVC recording has a different number of channels.
+		"""
+		if len(bounds) != len(self.channelNames):
+			raise ValueError(f'Expected MVC bounds for {len(self.channelNames)} channels, got {len(bounds)}')
+
+		self.calibration = dict(zip(self.channelNames, bounds.values()))
+
+	def base_channel(self, col: str) -> str:
+		"""
+		# Find the calibrated channel a raw or derived column comes from, such as CH1 for 'RMS 50ms (Bandpass (CH1))'.
+
+		Parameters
+		---
+		col : str
+			Name of the column.
+
+		Returns
+		---
+		channel : str
+			Key of self.calibration, or None if the column does not come from a calibrated channel.
+		"""
+		name = col
+		while name not in self.calibration and name.endswith(')') and '(' in name:
+			name = name[name.index('(') + 1:-1]
 
-		return min_max_list
+		return name if name in self.calibration else None
 
 	def RMS(self, colNames, slidingWindow):
 		"""
@@ -318,24 +520,85 @@ class EMGData:
 		#bandpass the signal
 		signal = signal.T
 
+		from scipy.signal import sosfilt
+
+		for sos in self._bandpass_filters():
+			signal = sosfilt(sos, signal)
+
+		signal = signal.T
+		for idx, col in enumerate(colNames):
+			new[col] = signal[:,idx]
+
+		return new
+
+	@staticmethod
+	def _bandpass_filters() -> list:
+		"""Second order sections of the low pass and high pass filters of bandpassing, in the order they are applied."""
+		from scipy.signal import butter
+
 		#Could be treated as dynamic input variables
 		order = 2
 		lowcut = 3
 		highcut = 0.01
 
-		sos = butter(order, lowcut, 'lowpass', fs=1024, output='sos')
-
-		signal = sosfilt(sos, signal)
-
-		sos = butter(order, highcut, 'highpass', fs=1024, output='sos')
+		return [butter(order, lowcut, 'lowpass', fs=1024, output='sos'), butter(order, highcut, 'highpass', fs=1024, output='sos')]
 
-		signal = sosfilt(sos, signal)
+	def stream_rms(self, slidingWindow: float=100, blockTime: float=10):
+		"""
+		# Calculate the normalized RMS of the bandpassed channels one block of samples at a time.
+		The filter states and the squared samples of the last window are carried from block to block, so the blocks
+		together equal the 'RMS (<channel>)' columns of preprocess. Each block is yielded as soon as it is calculated.
 
-		signal = signal.T
-		for idx, col in enumerate(colNames):
-			new[col] = signal[:,idx]
+		Parameters
+		---
+		slidingWindow : float, default 100
+			Length of the RMS window in ms.
+		blockTime : float, default 10
+			Length of each block in seconds.
 
-		return new
+		Yields
+		---
+		block : pd.DataFrame
+			Dataframe with the 'Elapse (s)' and 'RMS (<channel>)' columns of the next rows, keeping their index labels.
+			Like a rolling window, the first window length - 1 rows are empty.
+		"""
+		from scipy.signal import sosfilt
+
+		columns = ['RMS (' + channel + ')' for channel in self.channelNames]
+		signal = self.df[self.channelNames]
+		means = signal.mean().to_numpy()
+		elapsed = self.elapsed().to_numpy()
+		bounds = np.array([self.calibration.get(channel, (0, 1)) for channel in self.channelNames], dtype='float64').reshape(-1, 2)
+		low, high = bounds[:, 0], bounds[:, 1]
+
+		filters = self._bandpass_filters()
+		states = [np.zeros((len(sos), len(columns), 2)) for sos in filters]
+		length = max(int((slidingWindow / 1000.0) // self.period), 1)
+		blockLength = max(int(blockTime // self.period), 1)
+		previous = np.zeros((0, len(columns)))
+
+		for start in range(0, len(self.df), blockLength):
+			rows = slice(start, start + blockLength)
+
+			#Same steps as bandpassing, continuing the filters from the end of the previous block
+			block = np.abs(means - signal.iloc[rows].to_numpy(dtype='float64')).astype('float32').T
+			for idx, sos in enumerate(filters):
+				block, states[idx] = sosfilt(sos, block, zi=states[idx])
+
+			#Rolling mean of the squares over the samples of this block and the end of the previous one
+			squares = np.concatenate([previous, block.T ** 2])
+			sums = np.zeros((len(squares) + 1, len(columns)))
+			np.cumsum(squares, axis=0, out=sums[1:])
+			ends = np.arange(len(previous), len(squares)) + 1
+			valid = ends >= length
+			rms = np.full((len(ends), len(columns)), np.nan)
+			# Rounding can leave tiny negative mean squares on flat signals
+			rms[valid] = np.sqrt(np.maximum((sums[ends[valid]] - sums[ends[valid] - length]) / length, 0))
+			previous = squares[len(squares) - min(length - 1, len(squares)):]
+
+			new = pd.DataFrame((rms - low) / (high - low), columns=columns, index=self.df.index[rows])
+			new.insert(0, 'Elapse (s)', elapsed[rows])
+			yield new
 
 	def moving_average(self, colNames):
 		"""
@@ -361,42 +624,224 @@ class EMGData:
 
 		return new
 
+	def feature_bank(self, colNames, windowTimes: list) -> pd.DataFrame:
+		"""
+		# Calculate the moving average and RMS of the specified columns for several window lengths in one pass.
+		One prefix sum of the signal and one of its square are built once; every window length is then a single
+		vectorized subtraction of the prefix sums, O(n) per window whatever its length.
+
+		Parameters
+		---
+		colNames : str or list
+			Name(s) of column(s) to calculate the features of, usually the bandpassed channels.
+		windowTimes : list
+			Window lengths in ms.
+
+		Returns
+		---
+		feature_bank : pd.DataFrame
+			Dataframe with a 'Moving Average <window>ms (<column>)' and a 'RMS <window>ms (<column>)' column for every
+			window and input column. Like a rolling window, the first window length - 1 rows are empty.
+		"""
+		if type(colNames) != list:
+			colNames = [colNames]
+
+		signal = self.df[colNames].to_numpy(dtype='float64')
+		samples = len(signal)
+
+		sums = np.zeros((samples + 1, len(colNames)))
+		np.cumsum(signal, axis=0, out=sums[1:])
+		squares = np.zeros((samples + 1, len(colNames)))
+		np.cumsum(signal ** 2, axis=0, out=squares[1:])
+
+		new = pd.DataFrame(index=self.df.index)
+		for windowTime in windowTimes:
+			length = max(int((windowTime / 1000.0) // self.period), 1)
+
+			average = np.full(signal.shape, np.nan)
+			rms = np.full(signal.shape, np.nan)
+			if length <= samples:
+				average[length - 1:] = (sums[length:] - sums[:-length]) / length
+				# Rounding can leave tiny negative mean squares on flat signals
+				rms[length - 1:] = np.sqrt(np.maximum((squares[length:] - squares[:-length]) / length, 0))
+
+			for idx, col in enumerate(colNames):
+				new[f'Moving Average {windowTime:g}ms ({col})'] = average[:, idx]
+			for idx, col in enumerate(colNames):
+				new[f'RMS {windowTime:g}ms ({col})'] = rms[:, idx]
+
+		return new
+
+	def spectral_features(self, colNames: str or list=None, windowTime: float=0.5, stepTime: float=0.25, chunkWindows: int=1024) -> pd.DataFrame:
+		"""
+		# Calculate the median and mean power frequency over time, used to track muscle fatigue.
+
+		Parameters
+		---
+		colNames : str or list, default self.channelNames
+			Name(s) of the raw EMG column(s) to analyse.
+		windowTime : float, default 0.5
+			Length of each spectral window in seconds.
+		stepTime : float, default 0.25
+			Time in seconds between the starts of consecutive windows.
+		chunkWindows : int, default 1024
+			Number of windows transformed at once, see spectral.spectral_frequencies.
+
+		Returns
+		---
+		spectral_features : pd.DataFrame
+			Dataframe with a 'Median Frequency (<column>)' and a 'Mean Frequency (<column>)' column for every input column, in Hz.
+			Each window's value is placed at its last sample and held until the next window ends.
+		"""
+		colNames = colNames or self.channelNames
+		if type(colNames) != list:
+			colNames = [colNames]
+
+		windowLength = int(windowTime // self.period)
+		step = max(int(stepTime // self.period), 1)
+		ends, median, mean = spectral_frequencies(self.df[colNames].to_numpy(), self.frequency, windowLength, step, chunkWindows)
+
+		new = pd.DataFrame(index=self.df.index)
+		for name, values in [('Median Frequency', median), ('Mean Frequency', mean)]:
+			held = np.full((len(self.df), len(colNames)), np.nan)
+			held[ends] = values
+			held = pd.DataFrame(held).ffill().to_numpy()
+			for idx, col in enumerate(colNames):
+				new[f'{name} ({col})'] = held[:, idx]
+
+		return new
+
 	def normalize(self, originalChannels, colNames: str or list=None) -> pd.Series or pd.DataFrame:
 		"""
-		# Normalize the data in the specified columns between 0-1.
+		# Normalize the data in the specified columns between the MVC min and max of the channels they come from.
+		All derived columns are scaled together in one broadcast operation on a samples by columns array, for any
+		number of sensors and channels.
 
 		Parameters
 		---
+		originalChannels : list
+			Name(s) of column(s) that are returned unchanged.
 		colNames : str or list
 			Name(s) of column(s) to normalize.
 
 		Returns
 		---
 		normalized : pd.Series or pd.DataFrame
-			Dataframe containing the input columns normalized between 0-1.
+			Dataframe containing the input columns normalized to their MVC range. Columns that do not come from a
+			calibrated channel, see base_channel, are returned unchanged.
 		"""
 		colNames = colNames or self.channelNames
 
-		new = pd.DataFrame()
-
 		if type(colNames) is not list:
 			colNames = [colNames]
 
-		count = 0
-		for col in colNames:
-			if col in originalChannels:
-				new[col] = self.df[col]
-			else:
-				if count % 2 == 0:
-					min, max = self.min_max_list[0]
-				else:
-					min, max = self.min_max_list[1]
+		derived = [col for col in colNames if col not in originalChannels]
+		bounds = np.array([self.calibration.get(self.base_channel(col), (0, 1)) for col in derived], dtype='float64').reshape(-1, 2)
+		low, high = bounds[:, 0], bounds[:, 1]
 
-				new[col] = (self.df[col] - min) / (max - min)
+		values = (self.df[derived].to_numpy(dtype='float64') - low) / (high - low)
+		new = pd.DataFrame(values, columns=derived, index=self.df.index)
 
-			count = count + 1
+		kept = [col for col in colNames if col in originalChannels]
+		return pd.concat([self.df[kept], new], axis=1)[colNames]
 
-		return new
+	def decimate(self, factor: int, columns: str or list=None) -> 'EMGData':
+		"""
+		# Create a lower rate copy of the specified columns with anti-aliased decimation.
+
+		Parameters
+		---
+		factor : int
+			Ratio of the current to the new sampling rate.
+		columns : str or list, default self.find_columns(['Moving Average', 'RMS'])
+			Name(s) of column(s) to decimate, usually the envelope channels. Their content must lie well below the
+			new Nyquist frequency, anything above it is filtered out.
+
+		Returns
+		---
+		decimated : EMGData
+			EMG data at frequency / factor with the time column, the event column and the decimated columns as its
+			channels. Rows keep the index labels of the rows they were taken from.
+		"""
+		columns = columns or self.find_columns(['Moving Average', 'RMS'])
+		if type(columns) is not list:
+			columns = [columns]
+
+		df = self.df[[col for col in [self.timeName, self.eventName] if col in self.df.columns]].iloc[::factor]
+		values = pd.DataFrame(decimation.decimate(self.df[columns].to_numpy(), factor), columns=columns, index=df.index)
+
+		return EMGData(pd.concat([df, values], axis=1), columns, self.timeName, self.eventName, self.frequency / factor, self.maxDataPoints, self.windowTime, deepcopy(self.calibration))
+
+	def decimation_tiers(self, rates: list=[128, 16], columns: str or list=None) -> dict:
+		"""
+		# Create decimated copies of the specified columns at several lower sampling rates.
+		Every tier is decimated from the next higher one, so each sample of the full rate data is filtered once per tier.
+
+		Parameters
+		---
+		rates : list, default [128, 16]
+			Sampling rates in Hz. A rate that is not an integer fraction of the one above it is rounded to the nearest
+			one that is, rates above half the current one are skipped.
+		columns : str or list, default self.find_columns(['Moving Average', 'RMS'])
+			Name(s) of column(s) to decimate.
+
+		Returns
+		---
+		tiers : dict
+			Decimated EMGData objects by requested rate, see decimate.
+		"""
+		tiers = {}
+		source = self
+		for rate in sorted(rates, reverse=True):
+			factor = int(round(source.frequency / rate))
+			if factor < 2:
+				continue
+			source = source.decimate(factor, columns if source is self else None)
+			tiers[rate] = source
+
+		return tiers
+
+	def tier(self, points: int=None) -> 'EMGData':
+		"""
+		# Lowest rate decimation tier with at least the specified number of samples, or self if no tier has enough.
+
+		Parameters
+		---
+		points : int, default self.maxDataPoints
+			Number of samples needed, such as the points of a plot.
+
+		Returns
+		---
+		tier : EMGData
+			One of self.tiers, or self.
+		"""
+		points = points or self.maxDataPoints
+		for rate in sorted(self.tiers):
+			if len(self.tiers[rate].df) >= points:
+				return self.tiers[rate]
+
+		return self
+
+	def tier_error(self, rate: float) -> pd.DataFrame:
+		"""
+		# Compare a decimation tier with the full rate values at the same samples.
+
+		Parameters
+		---
+		rate : float
+			Rate of the tier in self.tiers.
+
+		Returns
+		---
+		error : pd.DataFrame
+			Max and RMS absolute difference of every channel of the tier, relative to the range of the full rate channel.
+		"""
+		tier = self.tiers[rate]
+		full = self.df[tier.channelNames]
+		diff = tier.df[tier.channelNames] - full.loc[tier.df.index]
+		span = full.max() - full.min()
+
+		return pd.DataFrame({'Max Error': diff.abs().max() / span, 'RMS Error': np.sqrt((diff ** 2).mean()) / span})
 
 	def percentiles(self, percentages: list or float=[0.9, 0.5, 0.1], columns: list or str=None) -> pd.DataFrame:
 		"""
@@ -449,15 +894,245 @@ class EMGData:
 		events : list
 			List of tuples containing the beginning and ending indices of events.
 		"""
+		bounds = self.event_bounds(eventsCol)
+		rows = self.df.iloc[bounds.ravel()]
+
+		return [(rows.iloc[i], rows.iloc[i+1]) for i in range(0, len(rows)-1, 2)]
+
+	def event_bounds(self, eventsCol: str=None) -> np.ndarray:
+		"""
+		# Find the row positions where events begin and end.
+		The event column is scanned once; later calls reuse the result for as long as the column and length are unchanged.
+
+		Parameters
+		---
+		eventsCol : str, default self.eventName
+			Name of the column containing the events.
+
+		Returns
+		---
+		bounds : np.ndarray
+			Events by 2 array of the row positions of the beginning and ending of every event.
+		"""
 		eventsCol = eventsCol or self.eventName
-		new = pd.DataFrame()
 
-		new['Toggle'] = self.df[eventsCol].diff()
-		new = self.df.loc[abs(new['Toggle']) == 3]
+		cached = self._eventBounds.get(eventsCol)
+		if cached is None or cached[0] != len(self.df):
+			toggles = np.flatnonzero(np.abs(np.diff(self.df[eventsCol].to_numpy())) == 3) + 1
+			toggles = toggles[:len(toggles) // 2 * 2]
+			cached = (len(self.df), toggles.reshape(-1, 2))
+			self._eventBounds[eventsCol] = cached
+
+		return cached[1]
 
-		return [(new.iloc[i], new.iloc[i+1]) for i in range(0, len(new)-1, 2)]
+	def sorted_time(self) -> np.ndarray:
+		"""
+		# The time column as a numpy array, verified to be sorted so it can be binary searched.
+		The check runs once per time column and length.
+
+		Raises
+		---
+		ValueError
+			The time column is not sorted in ascending order.
+		"""
+		time = self.time.to_numpy()
+		key = (self.timeName, len(time))
+
+		if self._sortedTime != key:
+			if np.any(time[1:] < time[:-1]):
+				raise ValueError('Time column is not sorted: ' + self.timeName)
+			self._sortedTime = key
+
+		return time
+
+	def _view(self, rows: slice) -> 'EMGData':
+		"""EMGData object sharing a positional slice of this dataframe instead of copying it."""
+		new = EMGData(self.df.iloc[rows], list(self.channelNames), self.timeName, self.eventName, self.frequency, self.maxDataPoints, self.windowTime, self.calibration)
+		if self._sortedTime is not None:
+			new._sortedTime = (self.timeName, len(new.df))
+		return new
 
-	def figure(self, x: str=None, y: str or list=None, visible: list=None, eventMarkers: str=None) -> go.Figure:
+	def slice_time(self, start: float=None, stop: float=None) -> 'EMGData':
+		"""
+		# Select the data between two times by binary search on the time column.
+
+		Parameters
+		---
+		start : float, default beginning of the data
+			First time to include, in units of the time column.
+		stop : float, default end of the data
+			Last time to include.
+
+		Returns
+		---
+		view : EMGData
+			EMGData object viewing the selected rows of this object's dataframe. It works with the rest of the API
+			(plotting, percentiles, export); call copy() on it before modifying its dataframe.
+
+		Raises
+		---
+		ValueError
+			The time column is not sorted.
+		"""
+		time = self.sorted_time()
+		first = 0 if start is None else int(np.searchsorted(time, start, 'left'))
+		last = len(time) if stop is None else int(np.searchsorted(time, stop, 'right'))
+
+		return self._view(slice(first, max(first, last)))
+
+	def slice_event(self, n: int, eventsCol: str=None) -> 'EMGData':
+		"""
+		# Select the data of one event, from its beginning to its ending row.
+
+		Parameters
+		---
+		n : int
+			Index of the event, in the order of find_events. Negative values count from the last event.
+		eventsCol : str, default self.eventName
+			Name of the column containing the events.
+
+		Returns
+		---
+		view : EMGData
+			EMGData object viewing the rows of the event, see slice_time.
+
+		Raises
+		---
+		IndexError
+			There is no event n.
+		"""
+		start, stop = self.event_bounds(eventsCol)[n]
+
+		return self._view(slice(start, stop + 1))
+
+	def epochs(self, before: float=2, after: float=5, columns: str or list=None, eventsCol: str=None) -> tuple:
+		"""
+		# Cut the data into event-locked epochs around the beginning of every event.
+		The epochs are gathered from a strided sliding window view of the channels, so only the selected windows are copied.
+
+		Parameters
+		---
+		before : float, default 2
+			Time in seconds before each event onset to include.
+		after : float, default 5
+			Time in seconds after each event onset to include.
+		columns : str or list, default self.find_columns(['RMS ('])
+			Name(s) of column(s) to cut into epochs.
+		eventsCol : str, default self.eventName
+			Name of the column containing the events.
+
+		Returns
+		---
+		epochs : np.ndarray
+			Events by samples by columns array. Events too close to the start or end of the data to fit are left out.
+		offsets : np.ndarray
+			Time in seconds of every sample relative to its event onset.
+		events : np.ndarray
+			Indices, in the order of find_events, of the events that were kept.
+		"""
+		columns = columns or self.find_columns(['RMS ('])
+		if type(columns) != list:
+			columns = [columns]
+
+		samplesBefore = int(before // self.period)
+		length = samplesBefore + int(after // self.period) + 1
+		signal = self.df[columns].to_numpy(dtype='float64')
+		offsets = (np.arange(length) - samplesBefore) * self.period
+
+		starts = self.event_bounds(eventsCol)[:, 0] - samplesBefore
+		events = np.flatnonzero((starts >= 0) & (starts + length <= len(signal)))
+		if len(events) == 0:
+			return np.empty((0, length, len(columns))), offsets, events
+
+		# windows x columns x samples, a view on the signal
+		windows = sliding_window_view(signal, length, axis=0)
+		return windows[starts[events]].transpose(0, 2, 1), offsets, events
+
+	@staticmethod
+	def ensemble(epochs: np.ndarray, percentages: list=[0.9, 0.5, 0.1]) -> dict:
+		"""
+		# Calculate the ensemble statistics of event-locked epochs across events.
+
+		Parameters
+		---
+		epochs : np.ndarray
+			Events by samples by columns array, as returned by epochs.
+		percentages : list, default [0.9, 0.5, 0.1]
+			Percentiles to calculate.
+
+		Returns
+		---
+		ensemble : dict
+			'mean' and 'std' samples by columns arrays, and 'percentiles' mapping every percentage to a samples by columns array.
+			Empty samples (such as the start of a rolling window) are ignored.
+		"""
+		percentiles = np.nanpercentile(epochs, np.asarray(percentages) * 100, axis=0) if len(epochs) else np.full((len(percentages),) + epochs.shape[1:], np.nan)
+		return {
+			'mean': np.nanmean(epochs, axis=0) if len(epochs) else np.full(epochs.shape[1:], np.nan),
+			'std': np.nanstd(epochs, axis=0) if len(epochs) else np.full(epochs.shape[1:], np.nan),
+			'percentiles': dict(zip(percentages, percentiles)),
+		}
+
+	def epoch_figure(self, before: float=2, after: float=5, columns: str or list=None, eventsCol: str=None) -> go.Figure:
+		"""
+		# Create a plotly figure of the event-locked average of the data.
+
+		Parameters
+		---
+		before : float, default 2
+			Time in seconds before each event onset to include.
+		after : float, default 5
+			Time in seconds after each event onset to include.
+		columns : str or list, default self.find_columns(['RMS ('])
+			Name(s) of column(s) to average.
+		eventsCol : str, default self.eventName
+			Name of the column containing the events.
+
+		Returns
+		---
+		fig : go.Figure
+			Plotly figure with the ensemble mean of every column and a shaded band of one standard deviation around it.
+			Data is sampled based on the maximum number of data points allowed.
+		"""
+		import plotly.graph_objs as go
+
+		columns = columns or self.find_columns(['RMS ('])
+		if type(columns) != list:
+			columns = [columns]
+
+		epochs, offsets, events = self.epochs(before, after, columns, eventsCol)
+		stats = self.ensemble(epochs)
+
+		# Plot no more than the maximum number of data points per trace
+		idxs = slice(None, None, max(len(offsets) // self.maxDataPoints, 1))
+		offsets = offsets[idxs]
+
+		fig = go.Figure()
+		for idx, col in enumerate(columns):
+			mean, std = stats['mean'][idxs, idx], stats['std'][idxs, idx]
+			fig.add_trace(go.Scatter(
+				x=np.concatenate([offsets, offsets[::-1]]),
+				y=np.concatenate([mean + std, (mean - std)[::-1]]),
+				fill='toself',
+				opacity=0.2,
+				line={'width': 0},
+				hoverinfo='skip',
+				legendgroup=col,
+				showlegend=False,
+			))
+			fig.add_trace(go.Scatter(x=offsets, y=mean, name=col, legendgroup=col))
+
+		fig.add_vline(0, line_dash='dash', line_color='green')
+		fig.update_layout(
+			title=f"Event-Locked Average ({len(events)} events)",
+			xaxis_title="Time from Event Onset (s)",
+			yaxis_title="Processed Values",
+			legend_title="Data Source",
+		)
+
+		return fig
+
+	def figure(self, x: str=None, y: str or list=None, visible: list=None, eventMarkers: str=None, webgl: bool=False) -> go.Figure:
 		"""
 		# Create a plotly express figure from the data.
 
@@ -471,19 +1146,24 @@ class EMGData:
 			Name of the columns to make visible by default.
 		eventMarkers : str, default to don't show
 			Name of the column containing the events.
+		webgl : bool, default False
+			Draw the traces with WebGL (Scattergl) instead of SVG.
 
 		Returns
 		---
 		fig : go.Figure
 			Plotly express figure containing the EMG data. Data is sampled based on the maximum number of data points allowed.
 		"""
+		import plotly.graph_objs as go
+
 		x =  x or self.timeName
 		y = y or self.find_columns(['CH'])
+		trace = go.Scattergl if webgl else go.Scatter
 
 		fig = go.Figure()
 
 		for line in y:
-			newFig = go.Scatter(
+			newFig = trace(
 				x=self.df[x].iloc[self.idxs],
 				y=self.df[line].iloc[self.idxs],
 				name=line
@@ -506,6 +1186,43 @@ class EMGData:
 
 		return fig
 
+	def live_figure(self, y: list, eventMarkers: str=None) -> go.Figure:
+		"""
+		# Create a figure with empty traces that are filled in later, such as by the live plot stream.
+
+		Parameters
+		---
+		y : list
+			Names of the traces.
+		eventMarkers : str, default to don't show
+			Name of the column containing the events, marked on the elapsed time of this data.
+
+		Returns
+		---
+		fig : go.Figure
+			Plotly figure laid out like figure() with 'Elapse (s)' as the x-axis.
+		"""
+		import plotly.graph_objs as go
+
+		fig = go.Figure()
+
+		for line in y:
+			fig.add_trace(go.Scatter(x=[], y=[], name=line))
+
+		if eventMarkers is not None:
+			elapsed = self.elapsed().to_numpy()
+			for start, stop in self.event_bounds(eventMarkers):
+				fig.add_vrect(elapsed[start], elapsed[stop], fillcolor='green', opacity=0.15)
+
+		fig.update_layout(
+			title="EMG Data",
+			xaxis_title='Elapse (s)',
+			yaxis_title="Processed Values",
+			legend_title="Data Source",
+		)
+
+		return fig
+
 	def fig_to_html(self, fig: go.Figure) -> str:
 		"""
 		# Convert a plotly express figure to an HTML div string.
@@ -520,9 +1237,69 @@ class EMGData:
 		html : str
 			HTML div string containing the plotly express figure.
 		"""
+		from plotly.offline import plot as plotly_plot
+
 		return plotly_plot(fig, include_plotlyjs=False, output_type='div')
 
-	def data_to_html(self, x: str=None, y: list or str=None, visible=None, eventMarkers=None) -> str:
+	def fig_to_binary_html(self, fig: go.Figure) -> str:
+		"""
+		# Convert a plotly figure to an HTML div string with the trace data packed as binary.
+		The x values are sent once and shared by every trace, and all x/y arrays are embedded as base64 encoded float32
+		typed arrays instead of decimal JSON text. The page decodes them and draws the figure with Plotly.newPlot.
+
+		Parameters
+		---
+		fig : go.Figure
+			Plotly figure whose traces all share the same x values, as made by figure().
+
+		Returns
+		---
+		html : str
+			HTML div string containing the figure and the script that draws it.
+
+		Raises
+		---
+		ValueError
+			The traces of the figure do not share the same x values.
+		"""
+		from plotly.utils import PlotlyJSONEncoder
+
+		traces = [trace.to_plotly_json() for trace in fig.data]
+		x = np.asarray(traces[0]['x'] if traces else [], dtype='float32')
+
+		ys = []
+		for trace in traces:
+			if not np.array_equal(np.asarray(trace.pop('x'), dtype='float32'), x):
+				raise ValueError('All traces must share the same x values: ' + str(trace.get('name')))
+			ys.append(self._encode_float32(trace.pop('y')))
+
+		divId = str(uuid.uuid4())
+		return (
+			f'<div id="{divId}" class="plotly-graph-div" style="height:100%; width:100%;"></div>\n'
+			'<script type="text/javascript">\n'
+			'(function () {\n'
+			'	let start = performance.now();\n'
+			'	let decode = function (text) {\n'
+			'		let bytes = Uint8Array.from(atob(text), function (c) { return c.charCodeAt(0); });\n'
+			'		return new Float32Array(bytes.buffer);\n'
+			'	};\n'
+			f'	let x = decode("{self._encode_float32(x)}");\n'
+			f'	let ys = {json.dumps(ys)};\n'
+			f'	let data = {json.dumps(traces, cls=PlotlyJSONEncoder)};\n'
+			'	data.forEach(function (trace, i) { trace.x = x; trace.y = decode(ys[i]); });\n'
+			f'	Plotly.newPlot("{divId}", data, {json.dumps(fig.layout.to_plotly_json(), cls=PlotlyJSONEncoder)}, {{responsive: true}}).then(function () {{\n'
+			'		console.log("EMG figure rendered in " + (performance.now() - start).toFixed(1) + " ms");\n'
+			'	});\n'
+			'})();\n'
+			'</script>'
+		)
+
+	@staticmethod
+	def _encode_float32(values) -> str:
+		"""Base64 text of the values as little endian float32."""
+		return b64encode(np.asarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+	def data_to_html(self, x: str=None, y: list or str=None, visible=None, eventMarkers=None, binary: bool=False) -> str:
 		"""
 		# Convert EMG data to a plotly express figure contained inside of an HTML div string.
 
@@ -536,14 +1313,18 @@ class EMGData:
 			Name of the columns to make visible by default.
 		eventMarkers : str, default no events marked
 			Name of the column containing the events.
+		binary : bool, default False
+			Render with WebGL and embed the data as binary typed arrays, see fig_to_binary_html.
 
 		Returns
 		---
 		html : str
 			HTML div string containing the plotly express figure.
 		"""
-		fig = self.figure(x, y, visible, eventMarkers)
+		fig = self.figure(x, y, visible, eventMarkers, webgl=binary)
 
+		if binary:
+			return self.fig_to_binary_html(fig)
 		return self.fig_to_html(fig)
 
 	def data_to_csv(self, fileName) -> str:
@@ -556,10 +1337,19 @@ class EMGData:
 		"""
 		self.df.to_csv(fileName)
 
-	def preprocess(self) -> 'EMGData':
+	def preprocess(self, windowTimes: list=None, spectral: bool=False, tierRates: list=[128, 16]) -> 'EMGData':
 		"""
 		# Process the data to make it ready for analysis.
 
+		Parameters
+		---
+		windowTimes : list, default no extra windows
+			Extra window lengths in ms for which a moving average and RMS of the bandpassed channels are added, see feature_bank.
+		spectral : bool, default False
+			Add the median and mean power frequency of the original channels, see spectral_features. These are in Hz and are not normalized.
+		tierRates : list, default [128, 16]
+			Sampling rates of the decimated copies of the moving average and RMS channels kept in tiers, see decimation_tiers.
+
 		Returns
 		---
 		new : EMGData
@@ -567,7 +1357,7 @@ class EMGData:
 		"""
 		new = self.copy()
 
-		new.df['Elapse (s)'] = new.time.diff().fillna(0).cumsum() / 1000
+		new.df['Elapse (s)'] = new.elapsed()
 		new.timeName = 'Elapse (s)'
 
 		originalChannels = self.channelNames
@@ -589,9 +1379,25 @@ class EMGData:
 		new.df[newChannels] = new.RMS(bandpassChannels, 100)
 		new.channelNames += newChannels
 
+		#Moving Average and RMS of Bandpass for every extra window
+		if windowTimes:
+			bank = new.feature_bank(bandpassChannels, windowTimes)
+			new.df[list(bank.columns)] = bank
+			new.channelNames += list(bank.columns)
+
 		print(new.channelNames)
 		#Normalize all channels except original channels
-		new.channels = new.normalize(originalChannels)     #re-implement with MVC
+		new.channels = new.normalize(originalChannels)
+
+		#Median and Mean Frequency of original Channels
+		if spectral:
+			features = new.spectral_features(originalChannels)
+			new.df[list(features.columns)] = features
+			new.channelNames += list(features.columns)
+
+		#Lower rate tiers of the moving average and RMS channels
+		if tierRates:
+			new.tiers = new.decimation_tiers(tierRates)
 
 		return new
 
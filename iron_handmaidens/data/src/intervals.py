@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class IntervalIndex:
+	"""
+	Index over the channels of processed EMG data answering statistics of any time interval without scanning it.
+	Mean and RMS come from prefix sums of the values and their squares in O(1). Min and max come from a sparse table
+	over fixed size blocks: O(1) for the whole blocks plus a scan of at most two partial blocks at the edges. Times are
+	mapped to rows by binary search on the sorted time column.
+	"""
+
+	blockSize = 256
+
+	def __init__(self, time, values, names: list) -> None:
+		self.time = np.asarray(time, dtype='float64')
+		self.values = np.asarray(values, dtype='float64')
+		self.names = names
+
+		if np.any(np.diff(self.time) < 0):
+			raise ValueError('Time column must be sorted to build an interval index')
+
+		samples, channels = self.values.shape
+		valid = ~np.isnan(self.values)
+		filled = np.where(valid, self.values, 0)
+
+		self.counts = np.zeros((samples + 1, channels), dtype='int64')
+		np.cumsum(valid, axis=0, out=self.counts[1:])
+		self.sums = np.zeros((samples + 1, channels))
+		np.cumsum(filled, axis=0, out=self.sums[1:])
+		self.squares = np.zeros((samples + 1, channels))
+		np.cumsum(filled ** 2, axis=0, out=self.squares[1:])
+
+		blocks = samples // self.blockSize
+		whole = self.values[:blocks * self.blockSize].reshape(blocks, self.blockSize, channels)
+		self.minTable = self._sparse_table(np.fmin.reduce(whole, axis=1, initial=np.inf), np.fmin)
+		self.maxTable = self._sparse_table(np.fmax.reduce(whole, axis=1, initial=-np.inf), np.fmax)
+
+	@classmethod
+	def from_emg(cls, emg: 'EMGData', columns: list=None) -> 'IntervalIndex':
+		"""
+		# Build the index for the specified columns of an EMGData object.
+
+		Parameters
+		---
+		emg : EMGData
+			EMG data, usually preprocessed.
+		columns : list, default emg.channelNames
+			Name(s) of column(s) to index.
+
+		Returns
+		---
+		index : IntervalIndex
+			Index over the columns, keyed by emg.timeName.
+		"""
+		columns = columns or emg.channelNames
+		return cls(emg.time.to_numpy(), emg.df[columns].to_numpy(), list(columns))
+
+	@staticmethod
+	def _sparse_table(level, reduce) -> list:
+		"""Level k holds the reduction of 2**k consecutive blocks starting at every block."""
+		table = [level]
+		blocks = len(level)
+		width = 1
+		while 2 * width <= blocks:
+			level = reduce(level[:-width], level[width:])
+			table.append(level)
+			width *= 2
+		return table
+
+	def bounds(self, start: float, stop: float) -> tuple:
+		"""Half open row range [first, last) of the samples with start <= time <= stop."""
+		return int(np.searchsorted(self.time, start, 'left')), int(np.searchsorted(self.time, stop, 'right'))
+
+	def _extreme(self, first: int, last: int, table: list, reduce, initial: float) -> np.ndarray:
+		firstBlock = -(-first // self.blockSize)
+		lastBlock = last // self.blockSize
+		if firstBlock >= lastBlock:
+			return reduce.reduce(self.values[first:last], axis=0, initial=initial)
+
+		level = int(np.log2(lastBlock - firstBlock))
+		result = reduce(table[level][firstBlock], table[level][lastBlock - (1 << level)])
+		result = reduce(result, reduce.reduce(self.values[first:firstBlock * self.blockSize], axis=0, initial=initial))
+		return reduce(result, reduce.reduce(self.values[lastBlock * self.blockSize:last], axis=0, initial=initial))
+
+	def stats(self, start: float, stop: float) -> dict:
+		"""
+		# Calculate the statistics of every indexed column between two times.
+
+		Parameters
+		---
+		start : float
+			Start of the interval, in units of the time column.
+		stop : float
+			End of the interval, inclusive.
+
+		Returns
+		---
+		stats : dict
+			Number of samples in the interval and, per column, its count of non empty values, mean, RMS, min and max.
+			Statistics of columns without values in the interval are None.
+		"""
+		first, last = self.bounds(start, stop)
+		last = max(first, last)
+
+		count = self.counts[last] - self.counts[first]
+		with np.errstate(invalid='ignore', divide='ignore'):
+			mean = (self.sums[last] - self.sums[first]) / count
+			rms = np.sqrt(np.maximum((self.squares[last] - self.squares[first]) / count, 0))
+		low = self._extreme(first, last, self.minTable, np.fmin, np.inf)
+		high = self._extreme(first, last, self.maxTable, np.fmax, -np.inf)
+
+		def number(value):
+			return float(value) if np.isfinite(value) else None
+
+		return {
+			'start': start,
+			'stop': stop,
+			'samples': last - first,
+			'channels': {
+				name: {
+					'count': int(count[idx]),
+					'mean': number(mean[idx]),
+					'rms': number(rms[idx]),
+					'min': number(low[idx]),
+					'max': number(high[idx]),
+				} for idx, name in enumerate(self.names)
+			},
+		}
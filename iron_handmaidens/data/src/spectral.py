@@ -0,0 +1,64 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def spectral_frequencies(signal: np.ndarray, frequency: float, windowLength: int, step: int, chunkWindows: int=1024) -> tuple:
+	"""
+	# Calculate the median and mean power frequency of every channel over sliding windows.
+	Windows are strided views of the signal, so no window is copied until its chunk is transformed. Each chunk of
+	windows is detrended, Hann windowed and transformed with one batched real FFT over all channels at once.
+
+	Parameters
+	---
+	signal : np.ndarray
+		Samples by channels array.
+	frequency : float
+		Sampling rate of the signal in Hz.
+	windowLength : int
+		Number of samples per window.
+	step : int
+		Number of samples between the starts of consecutive windows.
+	chunkWindows : int, default 1024
+		Number of windows transformed at once. Bounds the memory used for long recordings to about
+		chunkWindows * channels * windowLength floats.
+
+	Returns
+	---
+	ends : np.ndarray
+		Index of the last sample of every window.
+	median : np.ndarray
+		Windows by channels array of median power frequencies in Hz.
+	mean : np.ndarray
+		Windows by channels array of mean power frequencies in Hz.
+	"""
+	signal = np.asarray(signal, dtype='float64')
+	if signal.ndim == 1:
+		signal = signal[:, None]
+
+	if len(signal) < windowLength:
+		empty = np.empty((0, signal.shape[1]))
+		return np.empty(0, dtype='int64'), empty, empty.copy()
+
+	# windows x channels x samples, a view on the signal
+	windows = sliding_window_view(signal, windowLength, axis=0)[::step]
+	ends = np.arange(len(windows)) * step + windowLength - 1
+
+	taper = np.hanning(windowLength)
+	freqs = np.fft.rfftfreq(windowLength, 1 / frequency)
+
+	median = np.empty(windows.shape[:2])
+	mean = np.empty(windows.shape[:2])
+	for start in range(0, len(windows), chunkWindows):
+		chunk = windows[start:start + chunkWindows]
+		chunk = (chunk - chunk.mean(axis=-1, keepdims=True)) * taper
+
+		power = np.abs(np.fft.rfft(chunk, axis=-1)) ** 2
+		total = power.sum(axis=-1)
+		cumulative = np.cumsum(power, axis=-1)
+
+		with np.errstate(invalid='ignore', divide='ignore'):
+			mean[start:start + chunkWindows] = (power * freqs).sum(axis=-1) / total
+		medianIdx = np.minimum((cumulative < total[..., None] / 2).sum(axis=-1), len(freqs) - 1)
+		median[start:start + chunkWindows] = np.where(total > 0, freqs[medianIdx], np.nan)
+
+	return ends, median, mean
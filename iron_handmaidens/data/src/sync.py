@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def resample(time, values, grid) -> np.ndarray:
+	"""Linear interpolation of values onto grid, empty (NaN) outside of the sampled time range."""
+	return np.interp(grid, time, values, left=np.nan, right=np.nan)
+
+
+def envelope(signal, length: int) -> np.ndarray:
+	"""Mean rectified amplitude of all channels, smoothed with a moving average of length samples."""
+	signal = np.asarray(signal, dtype='float64')
+	if signal.ndim == 1:
+		signal = signal[:, None]
+	rectified = np.abs(signal - np.nanmean(signal, axis=0)).mean(axis=1)
+
+	length = max(min(length, len(rectified)), 1)
+	sums = np.concatenate([[0], np.cumsum(np.nan_to_num(rectified))])
+	smoothed = np.full(len(rectified), np.nan)
+	smoothed[length - 1:] = (sums[length:] - sums[:-length]) / length
+	return smoothed
+
+
+def estimate_lag(reference, other, maxLag: int=None) -> tuple:
+	"""
+	# Estimate the lag between two equally sampled signals by FFT cross-correlation in O(n log n).
+
+	Parameters
+	---
+	reference : array-like
+		Reference signal. Empty (NaN) samples are treated as zero.
+	other : array-like
+		Signal to compare, sampled on the same grid as the reference.
+	maxLag : int, default any lag
+		Largest lag in samples, in either direction, that is considered.
+
+	Returns
+	---
+	lag : float
+		Lag in samples, refined below one sample by fitting a parabola to the correlation peak. A feature at sample t
+		of other appears at sample t + lag of the reference.
+	correlation : float
+		Normalized correlation at the peak, between -1 and 1. Near zero means there was nothing to align on.
+	"""
+	from scipy.fft import next_fast_len, rfft, irfft
+
+	a = np.nan_to_num(np.asarray(reference, dtype='float64'))
+	b = np.nan_to_num(np.asarray(other, dtype='float64'))
+	a = a - a.mean()
+	b = b - b.mean()
+
+	norm = np.sqrt((a ** 2).sum() * (b ** 2).sum())
+	if norm == 0:
+		return 0.0, 0.0
+
+	size = next_fast_len(len(a) + len(b) - 1, real=True)
+	corr = irfft(rfft(a, size) * np.conj(rfft(b, size)), size)
+
+	# corr[k] is the correlation at lag k for k >= 0 and at lag k - size for the negative lags at the end
+	lags = np.concatenate([np.arange(len(a)), np.arange(-(len(b) - 1), 0)])
+	corr = np.concatenate([corr[:len(a)], corr[size - (len(b) - 1):]])
+	if maxLag is not None:
+		inside = np.abs(lags) <= maxLag
+		lags, corr = lags[inside], corr[inside]
+
+	order = np.argsort(lags)
+	lags, corr = lags[order], corr[order]
+	peak = int(np.argmax(corr))
+
+	lag = float(lags[peak])
+	if 0 < peak < len(corr) - 1:
+		left, centre, right = corr[peak - 1], corr[peak], corr[peak + 1]
+		curvature = left - 2 * centre + right
+		if curvature < 0:
+			lag += 0.5 * (left - right) / curvature
+
+	return lag, float(corr[peak] / norm)
+
+
+def estimate_sync(refTime, refSignal, otherTime, otherSignal, step: float, maxLag: int=None) -> dict:
+	"""
+	# Estimate the clock offset and drift of one recording relative to another.
+	Both signals are resampled onto a common grid and cross-correlated for the overall offset. The overlap is then
+	split in two halves whose residual lags give the drift.
+
+	Parameters
+	---
+	refTime, otherTime : array-like
+		Sorted timestamps of the reference and the other recording, in the same unit.
+	refSignal, otherSignal : array-like
+		Signals to align on, such as event markers or envelopes.
+	step : float
+		Grid spacing in time units, normally the sampling period.
+	maxLag : int, default any lag
+		Largest offset in grid steps that is considered.
+
+	Returns
+	---
+	sync : dict
+		offset: offset in time units at the centre of the overlap, centre: that time on the other clock,
+		drift: extra offset per time unit elapsed, and correlation: peak correlation of the overall estimate.
+		A time t of the other recording corresponds to t + offset + drift * (t - centre) on the reference clock.
+	"""
+	refTime = np.asarray(refTime, dtype='float64')
+	otherTime = np.asarray(otherTime, dtype='float64')
+
+	grid = np.arange(min(refTime[0], otherTime[0]), max(refTime[-1], otherTime[-1]) + step, step)
+	lag, correlation = estimate_lag(resample(refTime, refSignal, grid), resample(otherTime, otherSignal, grid), maxLag)
+	offset = lag * step
+
+	start = max(refTime[0], otherTime[0] + offset)
+	stop = min(refTime[-1], otherTime[-1] + offset)
+	middle = (start + stop) / 2
+	sync = {'offset': offset, 'centre': middle - offset, 'drift': 0.0, 'correlation': correlation}
+	if stop - start < 4 * step:
+		return sync
+
+	# Residual lags of the two halves, searched within a quarter of a half either way
+	residuals = []
+	for begin, end in [(start, middle), (middle, stop)]:
+		half = np.arange(begin, end, step)
+		residual, _ = estimate_lag(resample(refTime, refSignal, half), resample(otherTime + offset, otherSignal, half), max(len(half) // 4, 1))
+		residuals.append(residual * step)
+
+	sync['offset'] = offset + (residuals[0] + residuals[1]) / 2
+	sync['drift'] = (residuals[1] - residuals[0]) / ((stop - start) / 2)
+	return sync
+
+
+def map_time(time, sync: dict) -> np.ndarray:
+	"""Convert timestamps of the other recording to the reference clock, see estimate_sync."""
+	time = np.asarray(time, dtype='float64')
+	return time + sync['offset'] + sync['drift'] * (time - sync['centre'])
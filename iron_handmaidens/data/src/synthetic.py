@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from data.src.emg import EMGData
+
+
+def standard_session(minutes: float, frequency: float=1024, seed: int=0) -> EMGData:
+	"""Synthetic two channel recording with an event every 30 seconds, shaped like a Shimmer export."""
+	rng = np.random.default_rng(seed)
+	n = int(minutes * 60 * frequency)
+	time = 1.6e12 + np.arange(n) * (1000 / frequency)
+	events = np.where((np.arange(n) // int(30 * frequency)) % 2 == 1, 2, -1)
+
+	df = pd.DataFrame({
+		'Timestamp': time,
+		'CH1': rng.normal(0, 1, n) * np.where(events == 2, 3, 1),
+		'CH2': rng.normal(0, 1, n),
+		'Event': events,
+	})
+	return EMGData(df, ['CH1', 'CH2'], 'Timestamp', 'Event', frequency, 1000, 1, {'CH1': (0, 1), 'CH2': (0, 1)})
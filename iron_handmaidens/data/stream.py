@@ -0,0 +1,176 @@
+"""
+Server-Sent Events stream for the live visualize page.
+
+A live visualize page opens one stream per dataset in the module level hub and returns
+before the data is processed. A background thread per dataset then publishes the
+downsampled RMS points block by block while they are calculated, see publish_live. The
+ASGI application in iron_handmaidens/asgi.py routes STREAM_PATH to sse_application.
+Each watching browser is a single coroutine that polls the in-memory buffer, so one
+ASGI worker can serve many clients at once and every client sees the plot grow.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+STREAM_PATH = '/visualize/stream/'
+POLL_INTERVAL = 0.25    # seconds between checks for new chunks when a client is caught up
+CHUNK_POINTS = 100      # plotted points per pushed chunk
+PRECISION = 4           # decimal places kept by the delta encoding
+
+
+class PlotStream:
+    """Append-only buffer of encoded chunks for one dataset."""
+
+    def __init__(self, traces: list) -> None:
+        self.traces = traces
+        self.chunks = []
+        self.closed = False
+
+
+class StreamHub:
+    """Holds one PlotStream per displayed dataset. Replaced wholesale when new files are uploaded."""
+
+    def __init__(self) -> None:
+        self.streams = {}
+
+    def reset(self) -> None:
+        self.streams = {}
+
+    def open(self, dataset: int, traces: list) -> PlotStream:
+        stream = PlotStream(traces)
+        self.streams[dataset] = stream
+        return stream
+
+    def get(self, dataset: int) -> PlotStream:
+        return self.streams.get(dataset)
+
+
+hub = StreamHub()
+
+
+def delta_encode(values, scale: int) -> list:
+    """Quantize values to integers and store the first value followed by successive differences."""
+    import numpy as np
+
+    quantized = np.round(np.asarray(values, dtype='float64') * scale).astype('int64')
+    if len(quantized) == 0:
+        return []
+    return [int(quantized[0])] + np.diff(quantized).tolist()
+
+
+def encode_chunk(x, ys: list, precision: int=PRECISION) -> str:
+    """
+    # Encode one chunk of plot points as compact delta-encoded JSON.
+
+    Parameters
+    ---
+    x : array-like
+        Shared x values of the chunk.
+    ys : list
+        One array-like of y values per trace, all the same length as x.
+    precision : int, default PRECISION
+        Number of decimal places to keep.
+
+    Returns
+    ---
+    chunk : str
+        JSON text of the form {"s": scale, "x": [...], "y": [[...], ...]}. Each chunk starts
+        from an absolute value so chunks can be decoded independently.
+    """
+    scale = 10 ** precision
+    return json.dumps({
+        's': scale,
+        'x': delta_encode(x, scale),
+        'y': [delta_encode(y, scale) for y in ys],
+    }, separators=(',', ':'))
+
+
+def publish_live(stream: PlotStream, emg: 'EMGData', chunkPoints: int=CHUNK_POINTS) -> None:
+    """
+    # Publish the RMS of a raw dataset into its stream while it is being calculated, see EMGData.stream_rms.
+
+    Every block is thinned to the rows the plot of the whole recording would show and appended
+    as soon as it is calculated. Rows still empty at the start of the rolling window are
+    skipped. The stream is closed after the last block, or when the calculation fails.
+    """
+    step = emg.idxs.step or 1
+    position = 0
+    try:
+        for block in emg.stream_rms():
+            rows = block.iloc[(-position) % step::step].dropna()
+            position += len(block)
+
+            x = rows['Elapse (s)'].to_numpy()
+            ys = rows[stream.traces].to_numpy().T
+            for start in range(0, len(x), chunkPoints):
+                stop = start + chunkPoints
+                stream.chunks.append(encode_chunk(x[start:stop], ys[:, start:stop]))
+    finally:
+        stream.closed = True
+
+
+def _event(body: str, eventId: int=None, event: str=None) -> bytes:
+    lines = []
+    if event is not None:
+        lines.append('event: ' + event)
+    if eventId is not None:
+        lines.append('id: ' + str(eventId))
+    lines.append('data: ' + body)
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def sse_application(scope, receive, send) -> None:
+    """
+    ASGI application pushing the chunks of one dataset as Server-Sent Events.
+
+    The dataset is chosen with the `dataset` query parameter. Reconnecting browsers send the
+    Last-Event-ID header and resume after the last chunk they received.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    headers = dict(scope.get('headers', []))
+    try:
+        dataset = int(query.get('dataset', ['0'])[0])
+        offset = int(headers.get(b'last-event-id', b'-1')) + 1
+    except ValueError:
+        dataset, offset = 0, 0
+
+    stream = hub.get(dataset)
+    if stream is None:
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'No data to stream'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        while not disconnected.is_set():
+            pending = stream.chunks[offset:]
+            if pending:
+                body = b''.join(_event(chunk, offset + i) for i, chunk in enumerate(pending))
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                offset += len(pending)
+            elif (stream.closed and offset >= len(stream.chunks)) or hub.get(dataset) is not stream:
+                await send({'type': 'http.response.body', 'body': _event('', event='end')})
+                return
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        watcher.cancel()
@@ -1,3 +1,123 @@
+import numpy as np
 from django.test import TestCase
 
-# Create your tests here.
+from data.src import decimation
+from data.src.intervals import IntervalIndex
+from data.src.synthetic import standard_session
+
+
+class DecimationTests(TestCase):
+
+    def test_output_lines_up_with_stride(self):
+        time = np.arange(10001) / 1024
+        signal = np.column_stack([np.sin(2 * np.pi * 0.5 * time), np.cos(2 * np.pi * 1.5 * time)])
+        for factor in [8, 64]:
+            decimated = decimation.decimate(signal, factor)
+            self.assertEqual(decimated.shape, signal[::factor].shape)
+            # The pass band ripple, run both ways, is up to 1.2% and a shift of one output sample would be off by at
+            # least 0.07. The ends carry the filter's edge transient
+            np.testing.assert_allclose(decimated[2:-2], signal[::factor][2:-2], atol=0.02)
+
+    def test_single_channel(self):
+        signal = np.linspace(0, 1, 1000)
+        self.assertEqual(decimation.decimate(signal, 8).shape, signal[::8].shape)
+
+    def test_empty_samples_stay_empty(self):
+        signal = np.ones(100)
+        signal[:20] = np.nan
+        decimated = decimation.decimate(signal, 8)
+        self.assertTrue(np.isnan(decimated[:3]).all())
+        np.testing.assert_allclose(decimated[3:], 1)
+
+    def test_removes_content_above_new_nyquist(self):
+        signal = np.sin(2 * np.pi * 0.45 * np.arange(10000))
+        self.assertLess(np.abs(decimation.decimate(signal, 16)[5:-5]).max(), 0.01)
+
+    def test_stages(self):
+        self.assertEqual(decimation.stages(64), [8, 8])
+        self.assertEqual(decimation.stages(8), [8])
+        self.assertEqual(decimation.stages(1), [])
+        with self.assertRaises(ValueError):
+            decimation.stages(2.5)
+
+
+class TierErrorTests(TestCase):
+    """
+    Error of the decimation tiers against the full rate envelopes of a 10 minute 1024 Hz session, relative to the
+    range of each channel. The bounds are the documented ones: 0.32% max and 0.013% RMS at 128 Hz, 3.4% max and 0.67%
+    RMS at 16 Hz.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.processed = standard_session(10).preprocess([50, 250])
+
+    def test_tier_rates(self):
+        self.assertEqual({rate: tier.frequency for rate, tier in self.processed.tiers.items()}, {128: 128, 16: 16})
+        self.assertEqual(self.processed.tiers[16].channelNames, self.processed.find_columns(['Moving Average', 'RMS']))
+
+    def test_128_hz_error(self):
+        error = self.processed.tier_error(128)
+        self.assertLessEqual(error['Max Error'].max(), 0.0032)
+        self.assertLessEqual(error['RMS Error'].max(), 0.00013)
+
+    def test_16_hz_error(self):
+        error = self.processed.tier_error(16)
+        self.assertLessEqual(error['Max Error'].max(), 0.034)
+        self.assertLessEqual(error['RMS Error'].max(), 0.0067)
+
+    def test_tier_for_plot(self):
+        self.assertIs(self.processed.tier(1000), self.processed.tiers[16])
+        self.assertIs(self.processed.tier(len(self.processed.df)), self.processed)
+
+
+class IntervalIndexTests(TestCase):
+
+    def setUp(self):
+        random = np.random.default_rng(0)
+        # 40 whole blocks, between 2**5 and 1.5 * 2**5, plus a partial block
+        samples = 40 * IntervalIndex.blockSize + 100
+        self.time = np.arange(samples) / 1024
+        self.values = random.normal(size=(samples, 3))
+        self.values[:150, 1] = np.nan
+        self.values[:, 2] = np.nan
+        self.index = IntervalIndex(self.time, self.values, ['A', 'B', 'C'])
+
+    def assert_brute_force(self, start, stop):
+        stats = self.index.stats(start, stop)
+        rows = self.values[(self.time >= start) & (self.time <= stop)]
+        self.assertEqual(stats['samples'], len(rows))
+        for idx, name in enumerate(self.index.names):
+            column = rows[:, idx][~np.isnan(rows[:, idx])]
+            channel = stats['channels'][name]
+            self.assertEqual(channel['count'], len(column))
+            if len(column) == 0:
+                self.assertEqual([channel[key] for key in ['mean', 'rms', 'min', 'max']], [None] * 4)
+                continue
+            self.assertAlmostEqual(channel['mean'], column.mean())
+            self.assertAlmostEqual(channel['rms'], np.sqrt((column ** 2).mean()))
+            self.assertEqual(channel['min'], column.min())
+            self.assertEqual(channel['max'], column.max())
+
+    def test_full_range(self):
+        self.assert_brute_force(self.time[0], self.time[-1])
+        self.assert_brute_force(-1, self.time[-1] + 1)
+
+    def test_random_intervals(self):
+        random = np.random.default_rng(1)
+        for start, stop in np.sort(random.uniform(-0.5, self.time[-1] + 0.5, size=(200, 2)), axis=1):
+            self.assert_brute_force(start, stop)
+
+    def test_every_block_count(self):
+        values = np.random.default_rng(2).normal(size=(70 * IntervalIndex.blockSize + 1, 1))
+        for blocks in range(1, 71):
+            samples = blocks * IntervalIndex.blockSize + 1
+            index = IntervalIndex(np.arange(samples), values[:samples], ['A'])
+            self.assertEqual(len(index.minTable), int(np.log2(blocks)) + 1)
+            channel = index.stats(0, samples)['channels']['A']
+            self.assertEqual((channel['min'], channel['max']), (values[:samples].min(), values[:samples].max()))
+
+    def test_unsorted_time(self):
+        with self.assertRaises(ValueError):
+            IntervalIndex(self.time[::-1], self.values, ['A', 'B', 'C'])
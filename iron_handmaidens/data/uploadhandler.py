@@ -0,0 +1,72 @@
+"""
+Upload handler parsing csv files while the request body arrives.
+
+Only the EMG file fields of the upload form are handled. The columns to keep are passed in the
+query string, one parameter per field (for example ?MG-file1=ch1,ch2,time,event), because the
+multipart form fields are not available to upload handlers while the files are streaming. Files
+without a complete column list in the query string are left to the next handler and read with
+pandas in the view.
+"""
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+UPLOAD_FIELDS = ('MG-file', 'MVC-file')
+
+
+class ParsedCSVFile(UploadedFile):
+    """An uploaded csv file that has already been parsed. Holds the selected columns instead of the raw text."""
+
+    def __init__(self, name: str, columns: dict, size: int) -> None:
+        super().__init__(file=None, name=name, content_type='text/csv', size=size)
+        self.columns = columns
+
+
+class StreamingCSVUploadHandler(FileUploadHandler):
+    """
+    Feeds every chunk of an uploaded csv file into an IncrementalCSVParser, so parsing overlaps with the transfer and
+    no copy of the raw text is kept. Any other file, or a csv file without its columns in the query string, is passed on
+    to the next handler. A malformed file stops the upload and the reason is stored in request.upload_error.
+    """
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.parser = None
+
+        if not (field_name.startswith(UPLOAD_FIELDS) and file_name.lower().endswith('.csv')):
+            return
+
+        # Without the columns to keep, the file may have non-numeric columns the parser would reject
+        columns = self.request.GET.get(field_name, '').split(',')
+        if not all(columns):
+            return
+
+        from data.src.csvparser import IncrementalCSVParser
+
+        self.parser = IncrementalCSVParser(columns)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.parser is None:
+            return raw_data
+
+        try:
+            self.parser.feed(raw_data)
+        except ValueError as err:
+            self.reject(err)
+
+    def file_complete(self, file_size):
+        if self.parser is None:
+            return None
+
+        try:
+            columns = self.parser.close()
+        except ValueError as err:
+            self.reject(err)
+
+        self.parser = None
+        return ParsedCSVFile(self.file_name, columns, file_size)
+
+    def reject(self, err: ValueError):
+        self.parser = None
+        self.request.upload_error = f'{self.field_name} ({self.file_name}): {err}'
+        raise StopUpload()
@@ -5,6 +5,9 @@ from . import views
 urlpatterns = [
     path('', views.home, name='data-home'),
     path('visualize/', views.visualize, name='data-visualize'),
+    path('visualize/stats/', views.interval_stats, name='data-interval_stats'),
+    path('history/', views.history, name='data-history'),
+    path('memory/', views.memory_stats, name='data-memory'),
     path('about/', views.about, name='data-about'),
     path('error/', views.error, name='data-error'),
     path('visualize/download_zip/', views.download_zip, name="data-download_zip")
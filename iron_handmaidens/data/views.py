@@ -1,20 +1,137 @@
-from tkinter.font import names
+from django.db import DatabaseError
+from django.db.models import Count
 from django.shortcuts import render, redirect
 
-from data.src.emg import EMGData
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from data import records, stream
+from data.memory import datasets
+from data.models import Session, Statistic
 import glob, os
+import hashlib
+import threading
+import time
+import uuid
 import zipfile
-from django.http import FileResponse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.http import FileResponse, HttpResponse, JsonResponse
 import traceback
 
-data, files = [], []
+# The datasets themselves are kept in the memory budgeted dataset manager, these lists hold their keys
+uploads, names, files, indexes, fingerprints = [], [], [], [], []
+# ETag of the processed results in files, and the latest rendered visualize pages by ETag
+filesKey = None
+pages = OrderedDict()
+PAGE_CACHE_SIZE = 4
+# Keys of the datasets processed for the last live page, which has no cache entry to drop them with, and the
+# background threads processing them
+liveKeys = []
+liveThreads = []
+
+def read_upload(file, tags: dict) -> tuple:
+    """
+    Reads one uploaded file into an EMGData object, differentiating between the file formats.
+    Returns the object and the time it took in seconds.
+    """
+    # Imported here so that pandas, SciPy and plotly are only loaded once the first upload arrives.
+    from data.src.emg import EMGData
+    from data.uploadhandler import ParsedCSVFile
+
+    start = time.perf_counter()
+    fileExtension = file.name.split('.')[-1]
+    if isinstance(file, ParsedCSVFile):
+        newData = EMGData.from_columns(file.columns, **tags)
+    elif fileExtension == 'csv':
+        newData = EMGData.read_csv(file, **tags)
+    elif fileExtension == 'mat':
+        newData = EMGData.read_mat(file, **tags)
+    else:
+        raise ValueError('Unsupported file type: ' + file.name)
+
+    return newData, time.perf_counter() - start
+
+def mvc_min_max(parsed) -> dict:
+    """Calibration bounds of an MVC file, computed as soon as the file has been parsed."""
+    return parsed.result()[0].min_max()
+
+def processing_key(*parts) -> str:
+    """Content address of processed results, from the fingerprints of the datasets and the parameters applied to them."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def cache_page(etag: str, page: bytes, files: list, indexes: list) -> None:
+    """Keeps a rendered visualize page with the keys of its processed datasets, which are dropped with the page."""
+    pages[etag] = (page, files, indexes)
+    while len(pages) > PAGE_CACHE_SIZE:
+        _, oldFiles, oldIndexes = pages.popitem(last=False)[1]
+        for key in [file[1] for file in oldFiles] + oldIndexes:
+            if key not in liveKeys:
+                datasets.discard(key)
+
+def store_processed(name: str, dataset, preprocessed, sessionKey: str, fileKey: str, indexKey: str) -> None:
+    """Keeps a processed dataset and its interval index for downloads and interval statistics, and saves its session."""
+    from data.src.intervals import IntervalIndex
+
+    datasets.put(fileKey, preprocessed)
+    try:
+        records.save_session(name, dataset, preprocessed, sessionKey)
+    except DatabaseError as e:
+        # The history is optional: a database that is not migrated, or the same session saved by a concurrent render,
+        # must not break the page
+        print('session not saved:', e)
+    # Only the plotted moving average and RMS traces are brushed, so only they are indexed
+    datasets.put(indexKey, IntervalIndex.from_emg(preprocessed, preprocessed.find_columns(['Moving Average', 'RMS'])))
+
+def process_live(liveStream, name: str, dataset, windowTimes: list, spectral: bool, sessionKey: str, fileKey: str, indexKey: str) -> None:
+    """
+    Background processing of one dataset of a live page. The RMS is published into the page's stream while it is
+    calculated, then the whole dataset is processed and stored as on a normal page.
+    """
+    from django.db import connection
+
+    try:
+        stream.publish_live(liveStream, dataset)
+        store_processed(name, dataset, dataset.preprocess(windowTimes, spectral), sessionKey, fileKey, indexKey)
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+    finally:
+        connection.close()
+
+def wait_live() -> None:
+    """Waits until the datasets of the last live page are processed and stored."""
+    global liveThreads
+
+    for thread in liveThreads:
+        thread.join()
+    liveThreads = []
+
+def discard_live() -> None:
+    """Drops the processed datasets of the last live page, unless a cached page still uses them."""
+    global liveKeys
+
+    wait_live()
+    used = {key for _, cachedFiles, cachedIndexes in pages.values() for key in [file[1] for file in cachedFiles] + cachedIndexes}
+    for key in liveKeys:
+        if key not in used:
+            datasets.discard(key)
+    liveKeys = []
+
+def revalidate(response, etag: str):
+    """Tags a response with its ETag and lets browsers keep it, as long as they check the ETag before reusing it."""
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 def home(request):
     """
     Initially shows homepage for application. After the user uploads a file, this function processes it
     and goes to the visualize page. There is also a safety feature for if the user does not upload a file.
     """
-    global data
+    global uploads
+    global names
+    global fingerprints
 
     for zip_file in glob.glob('*.zip'):
         os.remove(zip_file)
@@ -26,6 +143,13 @@ def home(request):
         # Change the file and column name forms into more friendly datatypes
 
         files = request.FILES
+        if getattr(request, 'upload_error', None):
+            print('malformed upload:', request.upload_error)
+            return redirect('data-error')
+        if not files:
+            print('no files uploaded')
+            return redirect('data-error')
+
         filelist = []
         for idx, filename in enumerate(files):
             filelist.append(filename)
@@ -48,94 +172,154 @@ def home(request):
 
         channelNames = dict(request.POST.lists())
 
-        # Loop through all submitted files and differentiates between their formats to read them.
+        # Names of the columns in each file being prepared for the contructor. The column name fields are in the
+        # same order as the files.
+        tags = {}
         for idx, filename in enumerate(files):
-            if filename.startswith('MVC'):
-                continue
-
-            if filename.endswith('1'):
-                suffix = '1'
-
-            # Names of the columns in the file being prepared for the contructor
-            tags = {
+            tags[filename] = {
                 'channelNames': [channelNames['ch1Name'][idx], channelNames['ch2Name'][idx]],
                 'timeName': channelNames['timestampName'][idx],
                 'eventName': channelNames['eventMarker'][idx],
-                'min_max_list': [(0, 1), (0, 1)]
+                'calibration': {}
             }
-            if len(files) > 2:
-                mvc_idx = idx - 2
-            else:
-                mvc_idx = idx - 1
-            mvc_tags = {
-                'channelNames': [channelNames['ch1Name'][mvc_idx], channelNames['ch2Name'][mvc_idx]],
-                'timeName': channelNames['timestampName'][mvc_idx],
-                'eventName': channelNames['eventMarker'][mvc_idx],
-                'min_max_list': [(0, 1), (0, 1)]
-            }
-            # Contructing the EMGData object based on the input file type
-
-
-            if filename.endswith('1'):
-                mvc_filename = 'MVC-file' + '1'
-            else:
-                mvc_filename = 'MVC-file' + '2'
-
-            file = request.FILES[filename]
-            mvc_file = request.FILES[mvc_filename]
 
+        # Parse every submitted file at once, each MVC file only once. Parsing spends most of its time in pandas,
+        # SciPy and numpy code that releases the GIL, so threads overlap well.
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            parsed = {filename: executor.submit(read_upload, files[filename], tags[filename]) for filename in files}
+            mvcs = {filename[-1]: executor.submit(mvc_min_max, parsed[filename]) for filename in files if filename.startswith('MVC')}
 
-            fileExtension = file.name.split('.')[1]
-            mvc_fileExtension = mvc_file.name.split('.')[1]
+            for filename in files:
+                print(f'Parsed {filename} ({files[filename].name}) in {parsed[filename].result()[1] * 1000:.0f} ms')
+            mvcBounds = {suffix: future.result() for suffix, future in mvcs.items()}
+        print(f'Parsed {len(files)} files in {(time.perf_counter() - start) * 1000:.0f} ms')
 
-            if fileExtension == 'csv':
-                newData = EMGData.read_csv(file, **tags)
-            elif fileExtension == 'mat':
-                newData = EMGData.read_mat(file, **tags)
+        for filename in files:
+            if filename.startswith('MVC'):
+                continue
 
-            if mvc_fileExtension == 'csv':
-                mvc_Data = EMGData.read_csv(mvc_file, **mvc_tags)
-            elif mvc_fileExtension == 'mat':
-                mvc_Data = EMGData.read_mat(mvc_file, **mvc_tags)
-            min_max_list = mvc_Data.min_max()
-            newData.min_max_list = min_max_list
+            file = files[filename]
+            newData = parsed[filename].result()[0]
+            newData.calibrate(mvcBounds[filename[-1]])
 
             # Storing the EMGData
-            if not data:
-                data.append(newData)
+            if not uploads:
+                uploads.append(uuid.uuid4().hex)
+                datasets.put(uploads[0], newData)
+                names.append(file.name)
             else:
                 try:
-                    data[0] = data[0].merge(newData)
+                    merged = datasets.get(uploads[0]).merge(newData, align=True)
+                    datasets.put(uploads[0], merged)
+                    names[0] += ' + ' + file.name
+                    print('Synchronized ' + file.name + ':', merged.syncReport)
                 except ValueError as e:
                     print('Skipping file: ' + file.name)
                     print('Reason:', e)
 
+        # Hashed once per upload, so every later request can be matched to its cached results
+        fingerprints = [datasets.get(key).fingerprint() for key in uploads]
+
         # Redirecting to the visualize the data
         return redirect('visualize/')
-    data = []
+    for key in uploads:
+        datasets.discard(key)
+    discard_live()
+    uploads = []
+    names = []
+    fingerprints = []
     return render(request, 'data/home.html')
 
 def visualize(request):
     """
     This page shows the user's data in a visual form, using plotly. This can be from one or multiple data files.
+    Extra moving average/RMS window lengths can be plotted with ?windows=50,250 (ms), and the median/mean power
+    frequency with ?spectral=1. The event-locked average covers ?before=2 to ?after=5 seconds around each event onset.
+    With ?live=1 the page is returned before the data is processed: the RMS plots start empty and are extended by the
+    server-sent event stream while a background thread calculates them (ASGI only). Live pages have no median/mean
+    frequency or event-locked plots, and downloads and interval statistics wait for the processing to finish.
+    The page is addressed by an ETag of the uploaded data and these parameters: a repeated request is answered from
+    the cache, or with 304 Not Modified if the browser already has it.
     """
-    global data
     global files
+    global indexes
+    global filesKey
+    global liveKeys
     try:
         # Ensuring we have data to use
-        if not data:
+        if not uploads:
             print('no data to process!')
             return redirect('data-error')
         # preprocess the data
+        live = request.GET.get('live') == '1'
+        windows = request.GET.get('windows', '')
+        windowTimes = [float(window) for window in windows.split(',') if window.strip()]
+        spectral = request.GET.get('spectral') == '1'
+        before = float(request.GET.get('before', 2))
+        after = float(request.GET.get('after', 5))
+        key = processing_key(fingerprints, windowTimes, spectral, before, after)
+        etag = quote_etag(key)
+        filesKey = etag
+
+        # Live pages are not cached, their plots depend on the stream being published for them
+        if not live and etag in pages:
+            pages.move_to_end(etag)
+            page, cachedFiles, cachedIndexes = pages[etag]
+            if all(name in datasets for name in [file[1] for file in cachedFiles] + cachedIndexes):
+                files, indexes = cachedFiles, cachedIndexes
+                response = get_conditional_response(request, etag=etag) or HttpResponse(page)
+                return revalidate(response, etag)
+
+        discard_live()
         tables = []
         plts = []
+        spectralPlts = []
+        epochPlts = []
         files = []
-        for i, dataset in enumerate(data):
+        indexes = []
+        stream.hub.reset()
+        for i, upload in enumerate(uploads):
+            dataset = datasets.get(upload)
             tables.append(dataset.percentiles().to_html(justify='center', index=False))
-            preprocessed = dataset.preprocess()
-            plts.append(preprocessed.data_to_html(visible=preprocessed.find_columns(['RMS']), eventMarkers=preprocessed.eventName))
-            files.append([f'data{i}.csv', preprocessed])
-        return render(request, 'data/visualize.html', {'data': zip(tables, plts)})
+            files.append([f'data{i}.csv', f'{key}:{i}'])
+            indexes.append(f'{key}:{i}:index')
+            sessionKey = processing_key(fingerprints[i], windowTimes, spectral)
+            if live:
+                rms = ['RMS (' + channel + ')' for channel in dataset.channelNames]
+                # The stream is opened before the page is returned, so browsers never find it missing
+                liveStream = stream.hub.open(i, rms)
+                plts.append(dataset.fig_to_html(dataset.live_figure(rms, dataset.eventName)))
+                spectralPlts.append('')
+                epochPlts.append('')
+                thread = threading.Thread(target=process_live, args=(liveStream, names[i], dataset, windowTimes, spectral, sessionKey, files[-1][1], indexes[-1]), daemon=True)
+                thread.start()
+                liveThreads.append(thread)
+                continue
+
+            preprocessed = dataset.preprocess(windowTimes, spectral)
+            # The moving average and RMS plots are drawn from the lowest rate tier that still has enough points
+            plotData = preprocessed.tier()
+            plts.append(plotData.data_to_html(y=plotData.find_columns(['Moving Average', 'RMS']), visible=plotData.find_columns(['RMS (']), eventMarkers=plotData.eventName, binary=True))
+            # The median and mean frequency are held between windows, so they are plotted from the full rate data
+            if spectral:
+                fig = preprocessed.figure(y=preprocessed.find_columns(['Median Frequency', 'Mean Frequency']), eventMarkers=preprocessed.eventName, webgl=True)
+                fig.update_layout(title='Median and Mean Frequency', yaxis_title='Frequency (Hz)')
+                spectralPlts.append(preprocessed.fig_to_binary_html(fig))
+            else:
+                spectralPlts.append('')
+            if len(preprocessed.event_bounds()):
+                epochPlts.append(preprocessed.fig_to_html(preprocessed.epoch_figure(before, after)))
+            else:
+                epochPlts.append('')
+            store_processed(names[i], dataset, preprocessed, sessionKey, files[-1][1], indexes[-1])
+        response = render(request, 'data/visualize.html', {'data': zip(tables, plts, spectralPlts, epochPlts), 'before': before, 'after': after, 'windows': windows, 'spectral': spectral, 'live': live, 'stream_path': stream.STREAM_PATH})
+        if live:
+            liveKeys = [file[1] for file in files] + indexes
+            return response
+
+        cache_page(etag, response.content, files, indexes)
+        return revalidate(response, etag)
 
     except Exception as e:
         print(e)
@@ -144,25 +328,115 @@ def visualize(request):
 
 
 def download_zip(request):
+    """
+    Downloads the processed data of the last visualize page as zipped csv files. With ?rate=128 or ?rate=16 only the
+    moving average and RMS channels are exported, from the decimation tier at that rate. The zip is written once per
+    ETag of the processed results and answered with 304 Not Modified if the browser already has it.
+    """
     try:
         global files
 
-        for file in files:
-            file[1].data_to_csv(file[0])
-        with zipfile.ZipFile('data.zip', 'w') as zipMe:
-            for file in files:
-                zipMe.write(file[0], compress_type=zipfile.ZIP_DEFLATED)
-        return FileResponse(
-            open('data.zip', 'rb'),
-            as_attachment=True,
-            filename='data.zip'
-        )
+        wait_live()
+        if filesKey is None:
+            print('no processed data to download!')
+            return redirect('data-error')
+
+        rate = request.GET.get('rate')
+        etag = quote_etag(filesKey.strip('"') + (f'-{int(rate)}Hz' if rate else ''))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            zipName = 'data-' + etag.strip('"')[:16] + (f'-{int(rate)}Hz' if rate else '') + '.zip'
+            if not os.path.exists(zipName):
+                for file in files:
+                    processed = datasets.get(file[1])
+                    (processed.tiers[int(rate)] if rate else processed).data_to_csv(file[0])
+                with zipfile.ZipFile(zipName + '.partial', 'w') as zipMe:
+                    for file in files:
+                        zipMe.write(file[0], compress_type=zipfile.ZIP_DEFLATED)
+                os.replace(zipName + '.partial', zipName)
+            response = FileResponse(
+                open(zipName, 'rb'),
+                as_attachment=True,
+                filename='data.zip'
+            )
+        return revalidate(response, etag)
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         return redirect('data-error')
 
 
+def interval_stats(request):
+    """
+    Returns the count, mean, RMS, min and max of every plotted moving average and RMS channel of one processed dataset
+    between two times as JSON.
+    Expects ?dataset=<index>&start=<seconds>&stop=<seconds>, answered from the interval index built by visualize.
+    """
+    wait_live()
+    try:
+        index = datasets.get(indexes[int(request.GET.get('dataset', 0))])
+        start = float(request.GET['start'])
+        stop = float(request.GET['stop'])
+    except (IndexError, KeyError, ValueError):
+        return JsonResponse({'error': 'Expected an existing dataset and a numeric start and stop'}, status=400)
+
+    return JsonResponse(index.stats(start, stop))
+
+
+def memory_stats(request):
+    """Returns the memory budget of the stored datasets, its usage and the eviction and reload counts as JSON."""
+    return JsonResponse(datasets.stats())
+
+
+def history(request):
+    """
+    Lists the saved sessions, optionally filtered by channel name and by the value of one statistic, and compares the
+    selected sessions side by side. Everything is answered from the database, no raw data is read.
+    """
+    channel = request.GET.get('channel', '')
+    kind = request.GET.get('kind', 'Peak (90%)')
+    minimum = request.GET.get('minimum', '')
+    compare = [int(pk) for pk in request.GET.getlist('compare') if pk.isdigit()]
+
+    # Conditions on the channels go in one filter call, so they must all hold for the same channel
+    conditions = {}
+    if channel:
+        conditions['channels__name__icontains'] = channel
+    if minimum:
+        try:
+            conditions.update({
+                'channels__statistics__kind': kind,
+                'channels__statistics__event': None,
+                'channels__statistics__value__gte': float(minimum),
+            })
+        except ValueError:
+            minimum = ''
+    sessions = Session.objects.annotate(eventCount=Count('events', distinct=True)).filter(**conditions)
+    sessions = sessions.distinct()[:200]
+
+    # Channels as rows and the compared sessions as columns
+    compared = list(Session.objects.filter(pk__in=compare))
+    table = {}
+    statistics = Statistic.objects.filter(channel__session__in=compared, kind=kind, event=None)
+    if channel:
+        statistics = statistics.filter(channel__name__icontains=channel)
+    for sessionId, name, value in statistics.values_list('channel__session_id', 'channel__name', 'value'):
+        table.setdefault(name, {})[sessionId] = value
+    rows = [(name, [values.get(session.pk) for session in compared]) for name, values in sorted(table.items())]
+
+    kinds = Statistic.objects.filter(event=None).values_list('kind', flat=True).distinct().order_by('kind')
+    return render(request, 'data/history.html', {
+        'sessions': sessions,
+        'channel': channel,
+        'kind': kind,
+        'kinds': kinds,
+        'minimum': minimum,
+        'compare': compare,
+        'compared': compared,
+        'rows': rows,
+    })
+
+
 def about(request):
     return render(request, 'data/about.html')
 
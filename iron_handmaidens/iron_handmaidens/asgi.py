@@ -2,6 +2,7 @@
 ASGI config for iron_handmaidens project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the live plot stream are answered by data.stream, everything else by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +14,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iron_handmaidens.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from data import preload
+from data.stream import STREAM_PATH, sse_application
+
+if preload.enabled():
+    preload.preload()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iron_handmaidens.settings')
 
 application = get_wsgi_application()
+
+from data import preload
+
+if preload.enabled():
+    preload.preload()